@@ -0,0 +1,69 @@
+from __future__ import print_function
+
+import numpy as np
+from keras_text_summarization.library.utility.sequence_utils import Seq2SeqBatchSequence
+
+NUM_TARGET_TOKENS = 20
+BATCH_SIZE = 4
+NUM_EPOCHS = 3
+
+
+def create_samples(num_samples, max_input_seq_length=12, max_target_seq_length=8):
+    random_state = np.random.RandomState(42)
+    x_samples = np.zeros(shape=(num_samples, max_input_seq_length), dtype=np.int32)
+    y_samples = np.zeros(shape=(num_samples, max_target_seq_length), dtype=np.int32)
+    for lineIdx in range(num_samples):
+        input_length = random_state.randint(1, max_input_seq_length + 1)
+        x_samples[lineIdx, max_input_seq_length - input_length:] = random_state.randint(1, 50, size=input_length)
+        target_length = random_state.randint(2, max_target_seq_length + 1)
+        y_samples[lineIdx, :target_length] = random_state.randint(1, NUM_TARGET_TOKENS, size=target_length)
+    return x_samples, y_samples
+
+
+def copy_batch(batch):
+    # one-hot batches are (inputs, targets), sparse ones (inputs, targets, weights)
+    return ([np.array(inputs) for inputs in batch[0]], ) + tuple([np.array(arrays) for arrays in batch[1:]])
+
+
+def same_batch(batch, other):
+    return all([np.array_equal(batch[0][idx], other[0][idx]) for idx in range(2)]) and \
+        all([np.array_equal(batch[idx], other[idx]) for idx in range(1, len(batch))])
+
+
+def check_buffers(prefetch, bucket_boundaries=None, sparse_targets=False):
+    """
+    Builds the batches of a Seq2SeqBatchSequence with the prefetch + 3 reused buffers of fit(..., prefetch=prefetch)
+    over several epochs, whose length is not a multiple of the number of buffers, and checks that none of the last
+    prefetch + 2 batches (the prefetch queue, the batch in training and the one being built) changes while the next
+    batches are built, also across the epoch boundaries. With sparse_targets, it also checks that the buffers hold no
+    one-hot vectors.
+    """
+    num_alive = prefetch + 2
+    x_samples, y_samples = create_samples((num_alive + 2) * BATCH_SIZE)
+    batch_sequence = Seq2SeqBatchSequence(x_samples, y_samples, BATCH_SIZE, NUM_TARGET_TOKENS,
+                                          bucket_boundaries=bucket_boundaries, sparse_targets=sparse_targets,
+                                          num_buffers=prefetch + 3)
+    alive = []
+    for epoch in range(NUM_EPOCHS):
+        for batchIdx in range(0, len(batch_sequence)):
+            batch = batch_sequence[batchIdx]
+            alive = (alive + [(batch, copy_batch(batch))])[-num_alive:]
+            for alive_batch, alive_copy in alive:
+                assert same_batch(alive_batch, alive_copy), 'a batch changed while %d batches were alive' % len(alive)
+        batch_sequence.on_epoch_end()
+    if sparse_targets:
+        for buffer in batch_sequence.buffers:
+            assert 'decoder_input' not in buffer, 'a sparse batch buffer holds one-hot vectors'
+
+
+def main():
+    for prefetch in [1, 2, 4]:
+        check_buffers(prefetch)
+        check_buffers(prefetch, bucket_boundaries=[4, 8])
+        check_buffers(prefetch, sparse_targets=True)
+        check_buffers(prefetch, bucket_boundaries=[4, 8], sparse_targets=True)
+        print('prefetch: %d  batches stay unchanged while alive' % prefetch)
+
+
+if __name__ == '__main__':
+    main()
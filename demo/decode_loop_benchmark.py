@@ -0,0 +1,171 @@
+from __future__ import print_function
+
+import time
+
+import numpy as np
+from keras.preprocessing.sequence import pad_sequences
+from keras_text_summarization.library.seq2seq import Seq2SeqSummarizer
+from keras_text_summarization.library.rnn import RecursiveRNN1, RecursiveRNN2
+
+NUM_TARGET_TOKENS = 2000
+MAX_TARGET_SEQ_LENGTH = 50
+NUM_REPEATS = 200
+
+
+class FixedPredictor(object):
+    """
+    Stands in for a trained sub-model: predict() returns outputs computed once up front, which never pick END, so
+    every summary runs for max_target_seq_length steps and the timing measures only the python side of a step.
+    """
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.calls = 0
+
+    def predict(self, inputs, batch_size=None):
+        self.calls += 1
+        return self.outputs
+
+
+def create_config():
+    input_words = ['PAD', 'UNK'] + ['in%d' % idx for idx in range(100)]
+    target_words = ['UNK', 'START', 'END'] + ['out%d' % idx for idx in range(NUM_TARGET_TOKENS - 3)]
+    config = dict()
+    config['num_input_tokens'] = len(input_words)
+    config['max_input_seq_length'] = 100
+    config['num_target_tokens'] = NUM_TARGET_TOKENS
+    config['max_target_seq_length'] = MAX_TARGET_SEQ_LENGTH
+    config['input_word2idx'] = dict([(word, idx) for idx, word in enumerate(input_words)])
+    config['input_idx2word'] = dict([(idx, word) for idx, word in enumerate(input_words)])
+    config['target_word2idx'] = dict([(word, idx) for idx, word in enumerate(target_words)])
+    config['target_idx2word'] = dict([(idx, word) for idx, word in enumerate(target_words)])
+    return config
+
+
+def predicted_token(num_target_tokens):
+    probabilities = np.zeros(shape=(num_target_tokens,))
+    probabilities[7] = 1
+    return probabilities
+
+
+# the summarize() loops as they were before they reused their step buffers
+def legacy_seq2seq_summarize(summarizer, input_text):
+    input_seq = summarizer.encode_input_text([input_text])
+    states_value = summarizer.encoder_model.predict(input_seq)
+    target_seq = np.zeros((1, 1, summarizer.num_target_tokens))
+    target_seq[0, 0, summarizer.target_word2idx['START']] = 1
+    target_text = ''
+    target_text_len = 0
+    terminated = False
+    while not terminated:
+        output_tokens, h, c = summarizer.decoder_model.predict([target_seq] + states_value)
+
+        sample_token_idx = np.argmax(output_tokens[0, -1, :])
+        sample_word = summarizer.target_idx2word[sample_token_idx]
+        target_text_len += 1
+
+        if sample_word != 'START' and sample_word != 'END':
+            target_text += ' ' + sample_word
+
+        if sample_word == 'END' or target_text_len >= summarizer.max_target_seq_length:
+            terminated = True
+
+        target_seq = np.zeros((1, 1, summarizer.num_target_tokens))
+        target_seq[0, 0, sample_token_idx] = 1
+
+        states_value = [h, c]
+    return target_text.strip()
+
+
+def legacy_encode_input_text(summarizer, input_text):
+    input_seq = []
+    input_wids = []
+    for word in input_text.lower().split(' '):
+        idx = 1  # default [UNK]
+        if word in summarizer.input_word2idx:
+            idx = summarizer.input_word2idx[word]
+        input_wids.append(idx)
+    input_seq.append(input_wids)
+    return pad_sequences(input_seq, summarizer.max_input_seq_length)
+
+
+def legacy_recursive_summarize(summarizer, step_predict, decoder_seq_length):
+    start_token = summarizer.target_word2idx['START']
+    wid_list = [start_token]
+    sum_input_seq = pad_sequences([wid_list], decoder_seq_length)
+    terminated = False
+
+    target_text = ''
+
+    while not terminated:
+        output_tokens = step_predict(sum_input_seq)
+        sample_token_idx = np.argmax(output_tokens[0, :])
+        sample_word = summarizer.target_idx2word[sample_token_idx]
+        wid_list = wid_list + [sample_token_idx]
+
+        if sample_word != 'START' and sample_word != 'END':
+            target_text += ' ' + sample_word
+
+        if sample_word == 'END' or len(wid_list) >= summarizer.max_target_seq_length:
+            terminated = True
+        else:
+            sum_input_seq = pad_sequences([wid_list], decoder_seq_length)
+    return target_text.strip()
+
+
+def time_summarize(summarize, input_text, predictor):
+    predictor.calls = 0
+    start_time = time.time()
+    for repeat in range(NUM_REPEATS):
+        summary = summarize(input_text)
+    seconds = time.time() - start_time
+    return summary, 1000000.0 * seconds / predictor.calls
+
+
+def report(name, legacy_summarize, summarize, input_text, predictor):
+    legacy_summary, legacy_us = time_summarize(legacy_summarize, input_text, predictor)
+    summary, us = time_summarize(summarize, input_text, predictor)
+    print('%s  legacy: %.1f us/step  reused buffers: %.1f us/step  speedup: %.2f  same summary: %s' % (
+        name, legacy_us, us, legacy_us / us, summary == legacy_summary))
+
+
+def main():
+    config = create_config()
+    input_text = ' '.join(['in%d' % (idx % 100) for idx in range(80)])
+    hidden = np.zeros(shape=(1, 100))
+
+    summarizer = Seq2SeqSummarizer(config)
+    summarizer.encoder_model = FixedPredictor([hidden, hidden])
+    decoder_model = FixedPredictor([predicted_token(NUM_TARGET_TOKENS)[np.newaxis, np.newaxis, :], hidden, hidden])
+    summarizer.decoder_model = decoder_model
+    report('Seq2SeqSummarizer', lambda text: legacy_seq2seq_summarize(summarizer, text), summarizer.summarize,
+           input_text, decoder_model)
+
+    rnn1 = RecursiveRNN1(config)
+    rnn1.article_encoder_model = FixedPredictor(np.zeros(shape=(1, 128)))
+    step_model = FixedPredictor(predicted_token(NUM_TARGET_TOKENS)[np.newaxis, :])
+    rnn1.step_model = step_model
+
+    def legacy_rnn1_summarize(text):
+        input_seq = legacy_encode_input_text(rnn1, text)
+        article_vector = rnn1.article_encoder_model.predict(input_seq)
+        return legacy_recursive_summarize(rnn1,
+                                          lambda sum_input_seq: step_model.predict([article_vector, sum_input_seq]),
+                                          rnn1.max_target_seq_length)
+
+    report('RecursiveRNN1', legacy_rnn1_summarize, rnn1.summarize, input_text, step_model)
+
+    rnn2 = RecursiveRNN2(config)
+    model = FixedPredictor(predicted_token(NUM_TARGET_TOKENS)[np.newaxis, :])
+    rnn2.model = model
+
+    def legacy_rnn2_summarize(text):
+        input_seq = legacy_encode_input_text(rnn2, text)
+        return legacy_recursive_summarize(rnn2, lambda sum_input_seq: model.predict([input_seq, sum_input_seq]),
+                                          min(rnn2.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH))
+
+    report('RecursiveRNN2', legacy_rnn2_summarize, rnn2.summarize, input_text, model)
+
+
+if __name__ == '__main__':
+    main()
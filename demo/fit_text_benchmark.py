@@ -0,0 +1,38 @@
+from __future__ import print_function
+
+import multiprocessing
+import time
+
+import pandas as pd
+from keras_text_summarization.library.applications.fake_news_loader import fit_text
+
+# the corpus is repeated to get closer to the size where the parallel count pays off
+CORPUS_REPEAT = 10
+
+
+def main():
+    data_dir_path = './data'
+
+    print('loading csv file ...')
+    df = pd.read_csv(data_dir_path + "/fake_or_real_news.csv")
+    X = list(df['text']) * CORPUS_REPEAT
+    Y = list(df.title) * CORPUS_REPEAT
+    print('articles: ', len(X))
+
+    start_time = time.time()
+    serial_config = fit_text(X, Y)
+    serial_seconds = time.time() - start_time
+    print('workers: 1 (serial)  seconds: %.2f' % serial_seconds)
+
+    num_workers = 2
+    while num_workers <= multiprocessing.cpu_count():
+        start_time = time.time()
+        config = fit_text(X, Y, num_workers=num_workers)
+        seconds = time.time() - start_time
+        print('workers: %d  seconds: %.2f  speedup: %.2f  same config: %s' % (
+            num_workers, seconds, serial_seconds / seconds, config == serial_config))
+        num_workers *= 2
+
+
+if __name__ == '__main__':
+    main()
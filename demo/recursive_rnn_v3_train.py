@@ -4,7 +4,7 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from keras_text_summarization.library.utility.plot_utils import plot_and_save_history
 from keras_text_summarization.library.rnn import RecursiveRNN3
-from keras_text_summarization.library.applications.fake_news_loader import fit_text
+from keras_text_summarization.library.applications.fake_news_loader import compile_text
 import numpy as np
 
 LOAD_EXISTING_WEIGHTS = False
@@ -24,7 +24,7 @@ def main():
     print('extract configuration from input texts ...')
     Y = df.title
     X = df['text']
-    config = fit_text(X, Y)
+    config, X, Y = compile_text(X, Y, cache_dir_path=data_dir_path + '/cache')
 
     print('configuration extracted from input texts ...')
 
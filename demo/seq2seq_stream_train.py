@@ -0,0 +1,44 @@
+from __future__ import print_function
+
+from keras_text_summarization.library.utility.plot_utils import plot_and_save_history
+from keras_text_summarization.library.utility.stream_utils import CsvTextStream, fit_stream
+from keras_text_summarization.library.seq2seq import Seq2SeqSummarizer
+from keras_text_summarization.library.applications.fake_news_loader import fit_text
+import numpy as np
+
+LOAD_EXISTING_WEIGHTS = False
+CHUNK_SIZE = 1000
+MAX_COUNTER_SIZE = None  # e.g. 1000000 to bound the memory used for counting the vocabulary
+
+
+def main():
+    np.random.seed(42)
+    data_dir_path = './data'
+    report_dir_path = './reports'
+    model_dir_path = './models'
+
+    # the csv file is read chunk by chunk and never loaded whole
+    csv_file_path = data_dir_path + "/fake_or_real_news.csv"
+    all_stream = CsvTextStream(csv_file_path, chunk_size=CHUNK_SIZE)
+    train_stream = CsvTextStream(csv_file_path, split='train', test_size=0.2, chunk_size=CHUNK_SIZE)
+    test_stream = CsvTextStream(csv_file_path, split='test', test_size=0.2, chunk_size=CHUNK_SIZE)
+
+    print('extract configuration from input texts ...')
+    config = fit_text(all_stream.texts(), all_stream.summaries(), max_counter_size=MAX_COUNTER_SIZE)
+
+    summarizer = Seq2SeqSummarizer(config)
+
+    if LOAD_EXISTING_WEIGHTS:
+        summarizer.load_weights(weight_file_path=Seq2SeqSummarizer.get_weight_file_path(model_dir_path=model_dir_path))
+
+    print('start fitting ...')
+    history = fit_stream(summarizer, train_stream, test_stream, epochs=100, model_dir_path=model_dir_path)
+
+    history_plot_file_path = report_dir_path + '/' + Seq2SeqSummarizer.model_name + '-history.png'
+    if LOAD_EXISTING_WEIGHTS:
+        history_plot_file_path = report_dir_path + '/' + Seq2SeqSummarizer.model_name + '-history-v' + str(summarizer.version) + '.png'
+    plot_and_save_history(history, summarizer.model_name, history_plot_file_path, metrics={'loss', 'acc'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from __future__ import print_function
+
+import os
+
+from sklearn.model_selection import train_test_split
+from keras_text_summarization.library.utility.plot_utils import plot_and_save_history
+from keras_text_summarization.library.utility.stream_utils import CsvTextStream
+from keras_text_summarization.library.utility.corpus_utils import encode_texts
+from keras_text_summarization.library.utility.token_dataset import TokenDatasetWriter, open_token_dataset
+from keras_text_summarization.library.seq2seq import Seq2SeqSummarizer
+from keras_text_summarization.library.applications.fake_news_loader import fit_text, fit_encoded_text
+from keras_text_summarization.library.applications.fake_news_loader import MAX_INPUT_SEQ_LENGTH, MAX_TARGET_SEQ_LENGTH
+import numpy as np
+
+LOAD_EXISTING_WEIGHTS = False
+
+
+def build_token_dataset(csv_file_path, dataset_dir_path):
+    # the csv file is read in chunks, so neither the texts nor the token ids need to fit in memory
+    stream = CsvTextStream(csv_file_path)
+    config = fit_text(stream.texts(), stream.summaries())
+    input_words = [config['input_idx2word'][idx] for idx in range(config['num_input_tokens'])]
+    target_words = [config['target_idx2word'][idx] for idx in range(config['num_target_tokens'])]
+
+    writer = TokenDatasetWriter(dataset_dir_path, MAX_INPUT_SEQ_LENGTH, MAX_TARGET_SEQ_LENGTH)
+    for texts, summaries in stream.iterate_chunks():
+        writer.write(encode_texts(texts, input_words, MAX_INPUT_SEQ_LENGTH, unknown_id=1),
+                     encode_texts(summaries, target_words, MAX_TARGET_SEQ_LENGTH, unknown_id=0, start_word='START',
+                                  end_word='END'))
+    writer.close()
+
+
+def main():
+    np.random.seed(42)
+    data_dir_path = './data'
+    report_dir_path = './reports'
+    model_dir_path = './models'
+    dataset_dir_path = data_dir_path + '/fake_or_real_news-tokens'
+
+    if not os.path.exists(dataset_dir_path + '/dataset.json'):
+        print('building token dataset ...')
+        build_token_dataset(data_dir_path + "/fake_or_real_news.csv", dataset_dir_path)
+
+    X, Y = open_token_dataset(dataset_dir_path)
+    config = fit_encoded_text(X, Y)
+
+    summarizer = Seq2SeqSummarizer(config)
+
+    if LOAD_EXISTING_WEIGHTS:
+        summarizer.load_weights(weight_file_path=Seq2SeqSummarizer.get_weight_file_path(model_dir_path=model_dir_path))
+
+    # split the row numbers, not the rows: X[rows] only records the rows, which fit() reads batch by batch
+    train_rows, test_rows = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    Xtrain, Xtest, Ytrain, Ytest = X[train_rows], X[test_rows], Y[train_rows], Y[test_rows]
+
+    print('training size: ', len(Xtrain))
+    print('testing size: ', len(Xtest))
+
+    print('start fitting ...')
+    history = summarizer.fit(Xtrain, Ytrain, Xtest, Ytest, epochs=100)
+
+    history_plot_file_path = report_dir_path + '/' + Seq2SeqSummarizer.model_name + '-history.png'
+    if LOAD_EXISTING_WEIGHTS:
+        history_plot_file_path = report_dir_path + '/' + Seq2SeqSummarizer.model_name + '-history-v' + str(summarizer.version) + '.png'
+    plot_and_save_history(history, summarizer.model_name, history_plot_file_path, metrics={'loss', 'acc'})
+
+
+if __name__ == '__main__':
+    main()
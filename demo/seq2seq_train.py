@@ -4,10 +4,12 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from keras_text_summarization.library.utility.plot_utils import plot_and_save_history
 from keras_text_summarization.library.seq2seq import Seq2SeqSummarizer
-from keras_text_summarization.library.applications.fake_news_loader import fit_text
+from keras_text_summarization.library.applications.fake_news_loader import compile_text
 import numpy as np
 
 LOAD_EXISTING_WEIGHTS = False
+SPARSE_TARGETS = False
+BUCKET_BOUNDARIES = None  # e.g. [100, 200, 300, 400] to pad each batch only up to its longest article
 
 
 def main():
@@ -23,7 +25,9 @@ def main():
     Y = df.title
     X = df['text']
 
-    config = fit_text(X, Y)
+    # tokenizes the texts once, fit() takes the token ids of X and Y instead of the raw texts
+    config, X, Y = compile_text(X, Y, cache_dir_path=data_dir_path + '/cache')
+    config['sparse_targets'] = SPARSE_TARGETS
 
     summarizer = Seq2SeqSummarizer(config)
 
@@ -36,7 +40,7 @@ def main():
     print('testing size: ', len(Xtest))
 
     print('start fitting ...')
-    history = summarizer.fit(Xtrain, Ytrain, Xtest, Ytest, epochs=100)
+    history = summarizer.fit(Xtrain, Ytrain, Xtest, Ytest, epochs=100, bucket_boundaries=BUCKET_BOUNDARIES)
 
     history_plot_file_path = report_dir_path + '/' + Seq2SeqSummarizer.model_name + '-history.png'
     if LOAD_EXISTING_WEIGHTS:
@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import collections
+
+import numpy as np
+from keras_text_summarization.library.utility.counter_utils import SpaceSavingCounter
+
+NUM_WORDS = 40
+NUM_SHARDS = 4
+SHARD_LENGTH = 200
+
+
+def create_shards(num_full_shards):
+    """
+    NUM_SHARDS shards of zipf distributed words, the first num_full_shards of which contain each of the NUM_WORDS
+    words at least once, so that their counters are full at capacity NUM_WORDS without evicting any word.
+    """
+    random_state = np.random.RandomState(42)
+    all_words = ['w%d' % wid for wid in range(NUM_WORDS)]
+    shards = []
+    for shardIdx in range(NUM_SHARDS):
+        shard = ['w%d' % wid for wid in random_state.zipf(1.5, size=SHARD_LENGTH) % NUM_WORDS]
+        if shardIdx < num_full_shards:
+            shard = shard + all_words
+        shards.append(shard)
+    return shards
+
+
+def check_exact_merge(shards, capacity):
+    """
+    Counts every shard with a SpaceSavingCounter and merges them in shard order, as the parallel fit_text() does, and
+    checks that the merged counts are exact and the same as those of collections.Counter over all the words.
+    """
+    merged = SpaceSavingCounter(capacity)
+    counter = collections.Counter()
+    for shard in shards:
+        shard_counter = SpaceSavingCounter(capacity)
+        shard_counter.update(shard)
+        assert shard_counter.exact, 'a shard counter evicted a word'
+        merged.update(shard_counter)
+        counter.update(shard)
+    assert merged.exact, 'merging exact shard counters gave inexact counts'
+    assert merged.counts == dict(counter), 'merged counts differ from collections.Counter'
+    assert merged.most_common() == counter.most_common(), 'merged most_common() differs from collections.Counter'
+
+
+def main():
+    for num_full_shards in [0, 1, NUM_SHARDS]:
+        shards = create_shards(num_full_shards)
+        shards_reversed = list(reversed(shards))
+        for capacity in [NUM_WORDS, NUM_WORDS + 10]:
+            check_exact_merge(shards, capacity)
+            check_exact_merge(shards_reversed, capacity)
+        print('full shards: %d  merged exact shard counters match collections.Counter' % num_full_shards)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
 from collections import Counter
+from keras_text_summarization.library.utility.corpus_utils import encode_corpus, get_corpus_hash
+from keras_text_summarization.library.utility.corpus_utils import save_encoded_texts, load_encoded_texts
+from keras_text_summarization.library.utility.counter_utils import SpaceSavingCounter
+from multiprocessing import Pool
+import numpy as np
+import os
+import shutil
+import tempfile
 
 MAX_INPUT_SEQ_LENGTH = 500
 MAX_TARGET_SEQ_LENGTH = 50
@@ -6,26 +14,76 @@ MAX_INPUT_VOCAB_SIZE = 5000
 MAX_TARGET_VOCAB_SIZE = 2000
 
 
-def fit_text(X, Y, input_seq_max_length=None, target_seq_max_length=None):
+def fit_text(X, Y, input_seq_max_length=None, target_seq_max_length=None, num_workers=None, max_counter_size=None):
+    """
+    With num_workers > 1, X and Y are split into num_workers contiguous shards that are counted in a process pool.
+    The shard counters are merged in shard order, so the words keep the order in which they first occur in the
+    corpus and most_common() breaks ties exactly like the serial count.
+
+    With max_counter_size, the words are counted by SpaceSavingCounters that keep at most max_counter_size words in
+    memory instead of every distinct word; the config then also holds their error reports for the chosen vocabularies
+    ('input_vocab_count_report' and 'target_vocab_count_report').
+    """
     if input_seq_max_length is None:
         input_seq_max_length = MAX_INPUT_SEQ_LENGTH
     if target_seq_max_length is None:
         target_seq_max_length = MAX_TARGET_SEQ_LENGTH
-    input_counter = Counter()
-    target_counter = Counter()
-    max_input_seq_length = 0
-    max_target_seq_length = 0
 
+    if num_workers is None or num_workers <= 1:
+        input_counter, max_input_seq_length = count_input_words(X, input_seq_max_length, max_counter_size)
+        target_counter, max_target_seq_length = count_target_words(Y, target_seq_max_length, max_counter_size)
+    else:
+        X_shards = split_into_shards(list(X), num_workers)
+        Y_shards = split_into_shards(list(Y), num_workers)
+        pool = Pool(num_workers)
+        try:
+            input_results = pool.starmap(count_input_words, [(shard, input_seq_max_length, max_counter_size)
+                                                             for shard in X_shards])
+            target_results = pool.starmap(count_target_words, [(shard, target_seq_max_length, max_counter_size)
+                                                               for shard in Y_shards])
+        finally:
+            pool.close()
+            pool.join()
+        input_counter, max_input_seq_length = merge_counts(input_results, max_counter_size)
+        target_counter, max_target_seq_length = merge_counts(target_results, max_counter_size)
+
+    input_words = [word for word, _ in input_counter.most_common(MAX_INPUT_VOCAB_SIZE)]
+    target_words = [word for word, _ in target_counter.most_common(MAX_TARGET_VOCAB_SIZE)]
+    config = create_config(input_words, target_words, max_input_seq_length, max_target_seq_length)
+
+    if max_counter_size is not None:
+        config['input_vocab_count_report'] = input_counter.error_report(MAX_INPUT_VOCAB_SIZE)
+        config['target_vocab_count_report'] = target_counter.error_report(MAX_TARGET_VOCAB_SIZE)
+        for name in ['input', 'target']:
+            report = config[name + '_vocab_count_report']
+            print('%s vocabulary count: exact %s, max error %d, %d words guaranteed in the exact top words' % (
+                name, report['exact'], report['max_error'], report['num_guaranteed']))
+    return config
+
+
+def create_word_counter(max_counter_size=None):
+    if max_counter_size is None:
+        return Counter()
+    return SpaceSavingCounter(max_counter_size)
+
+
+def count_input_words(X, input_seq_max_length, max_counter_size=None):
+    input_counter = create_word_counter(max_counter_size)
+    max_input_seq_length = 0
     for line in X:
         text = [word.lower() for word in line.split(' ')]
         seq_length = len(text)
         if seq_length > input_seq_max_length:
             text = text[0:input_seq_max_length]
             seq_length = len(text)
-        for word in text:
-            input_counter[word] += 1
+        input_counter.update(text)
         max_input_seq_length = max(max_input_seq_length, seq_length)
+    return input_counter, max_input_seq_length
+
 
+def count_target_words(Y, target_seq_max_length, max_counter_size=None):
+    target_counter = create_word_counter(max_counter_size)
+    max_target_seq_length = 0
     for line in Y:
         line2 = 'START ' + line.lower() + ' END'
         text = [word for word in line2.split(' ')]
@@ -33,20 +91,98 @@ def fit_text(X, Y, input_seq_max_length=None, target_seq_max_length=None):
         if seq_length > target_seq_max_length:
             text = text[0:target_seq_max_length]
             seq_length = len(text)
-        for word in text:
-            target_counter[word] += 1
-            max_target_seq_length = max(max_target_seq_length, seq_length)
+        target_counter.update(text)
+        max_target_seq_length = max(max_target_seq_length, seq_length)
+    return target_counter, max_target_seq_length
+
+
+def split_into_shards(lines, num_shards):
+    shard_size = (len(lines) + num_shards - 1) // num_shards
+    return [lines[start:start + shard_size] for start in range(0, len(lines), max(shard_size, 1))]
+
+
+def merge_counts(results, max_counter_size=None):
+    # update() appends unseen words at the end, so merging in shard order keeps the corpus order
+    counter = create_word_counter(max_counter_size)
+    max_seq_length = 0
+    for shard_counter, shard_max_seq_length in results:
+        counter.update(shard_counter)
+        max_seq_length = max(max_seq_length, shard_max_seq_length)
+    return counter, max_seq_length
+
+
+def compile_text(X, Y, input_seq_max_length=None, target_seq_max_length=None, cache_dir_path=None):
+    """
+    Same configuration as fit_text(), but the texts are tokenized only once: the returned EncodedTexts of X and Y
+    hold the token ids of that pass and can be passed to the fit() of every summarizer instead of the raw texts.
+
+    With cache_dir_path, the token ids are saved there under a hash of X, Y and the max lengths, and memory-mapped
+    from there by the next call with the same texts and settings.
+
+    Returns config, X_encoded, Y_encoded
+    """
+    if input_seq_max_length is None:
+        input_seq_max_length = MAX_INPUT_SEQ_LENGTH
+    if target_seq_max_length is None:
+        target_seq_max_length = MAX_TARGET_SEQ_LENGTH
+
+    cache_path = None
+    if cache_dir_path is not None:
+        X = list(X)
+        Y = list(Y)
+        corpus_hash = get_corpus_hash([X, Y], [input_seq_max_length, target_seq_max_length])
+        cache_path = os.path.join(cache_dir_path, 'corpus-' + corpus_hash)
+
+    if cache_path is not None and os.path.exists(cache_path):
+        print('loading encoded texts from ', cache_path)
+        X_encoded = load_encoded_texts(cache_path, 'input')
+        Y_encoded = load_encoded_texts(cache_path, 'target')
+    else:
+        X_encoded, _ = encode_corpus(X, input_seq_max_length, reserved_words=['PAD', 'UNK'])
+        Y_encoded, _ = encode_corpus(Y, target_seq_max_length, reserved_words=['UNK'], start_word='START',
+                                     end_word='END')
+        if cache_path is not None:
+            # written next to the final directory and renamed, so an interrupted run leaves no partial cache; every
+            # process writes its own temporary directory
+            os.makedirs(cache_dir_path, exist_ok=True)
+            temp_path = tempfile.mkdtemp(prefix=os.path.basename(cache_path) + '.tmp-', dir=cache_dir_path)
+            save_encoded_texts(X_encoded, temp_path, 'input')
+            save_encoded_texts(Y_encoded, temp_path, 'target')
+            try:
+                os.replace(temp_path, cache_path)
+            except OSError:
+                if not os.path.exists(cache_path):
+                    raise
+                # another process has written the same cache in the meantime
+                shutil.rmtree(temp_path)
+                print('loading encoded texts from ', cache_path)
+                X_encoded = load_encoded_texts(cache_path, 'input')
+                Y_encoded = load_encoded_texts(cache_path, 'target')
+
+    return fit_encoded_text(X_encoded, Y_encoded), X_encoded, Y_encoded
+
+
+def fit_encoded_text(X_encoded, Y_encoded):
+    """
+    The configuration of fit_text() for texts that are already encoded, e.g. those of open_token_dataset().
+    """
+    input_words = X_encoded.words[2:2 + MAX_INPUT_VOCAB_SIZE]
+    target_words = Y_encoded.words[1:1 + MAX_TARGET_VOCAB_SIZE]
+    return create_config(input_words, target_words, int(np.max(X_encoded.lengths, initial=0)),
+                         int(np.max(Y_encoded.lengths, initial=0)))
+
 
+def create_config(input_words, target_words, max_input_seq_length, max_target_seq_length):
     input_word2idx = dict()
-    for idx, word in enumerate(input_counter.most_common(MAX_INPUT_VOCAB_SIZE)):
-        input_word2idx[word[0]] = idx + 2
+    for idx, word in enumerate(input_words):
+        input_word2idx[word] = idx + 2
     input_word2idx['PAD'] = 0
     input_word2idx['UNK'] = 1
     input_idx2word = dict([(idx, word) for word, idx in input_word2idx.items()])
 
     target_word2idx = dict()
-    for idx, word in enumerate(target_counter.most_common(MAX_TARGET_VOCAB_SIZE)):
-        target_word2idx[word[0]] = idx + 1
+    for idx, word in enumerate(target_words):
+        target_word2idx[word] = idx + 1
     target_word2idx['UNK'] = 0
 
     target_idx2word = dict([(idx, word) for word, idx in target_word2idx.items()])
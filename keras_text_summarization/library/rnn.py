@@ -5,6 +5,11 @@ from keras.layers import Embedding, Dense, Input, RepeatVector, TimeDistributed,
 from keras.layers.recurrent import LSTM
 from keras.preprocessing.sequence import pad_sequences
 from keras.callbacks import ModelCheckpoint
+from keras_text_summarization.library.utility.sequence_utils import OneShotBatchSequence, RecursiveBatchSequence
+from keras_text_summarization.library.utility.decode_utils import create_decode_stats, prefix_greedy_decode
+from keras_text_summarization.library.utility.decode_utils import trim_at_end_token
+from keras_text_summarization.library.utility.prefetch_utils import create_prefetch_stats, fit_sequences
+from keras_text_summarization.library.utility.corpus_utils import EncodedTexts, PaddedTexts
 import numpy as np
 import os
 
@@ -12,6 +17,7 @@ HIDDEN_UNITS = 100
 DEFAULT_BATCH_SIZE = 64
 VERBOSE = 1
 DEFAULT_EPOCHS = 10
+DEFAULT_WORKERS = 1
 
 
 class OneShotRNN(object):
@@ -38,6 +44,7 @@ class OneShotRNN(object):
         self.version = 0
         if 'version' in config:
             self.version = config['version']
+        self.prefetch_stats = create_prefetch_stats()
 
         print('max_input_seq_length', self.max_input_seq_length)
         print('max_target_seq_length', self.max_target_seq_length)
@@ -64,6 +71,11 @@ class OneShotRNN(object):
             self.model.load_weights(weight_file_path)
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_input_seq_length, num_tokens=self.num_input_tokens, unknown_id=1)
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -81,37 +93,32 @@ class OneShotRNN(object):
         return temp
 
     def transform_target_encoding(self, texts):
-        temp = []
-        for line in texts:
-            x = []
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_target_seq_length, padding='post', num_tokens=self.num_target_tokens)
+            print(temp.shape)
+            return temp
+
+        temp = np.zeros(shape=(len(texts), self.max_target_seq_length), dtype=np.int32)
+        for lineIdx, line in enumerate(texts):
             line2 = 'START ' + line.lower() + ' END'
-            for word in line2.split(' '):
-                x.append(word)
-                if len(x) >= self.max_target_seq_length:
+            for idx, word in enumerate(line2.split(' ')):
+                if idx >= self.max_target_seq_length:
                     break
-            temp.append(x)
+                if word in self.target_word2idx:
+                    temp[lineIdx, idx] = self.target_word2idx[word]  # default [UNK] is 0
 
-        temp = np.array(temp)
         print(temp.shape)
         return temp
 
+    def create_batch_sequence(self, x_samples, y_samples, batch_size):
+        return OneShotBatchSequence(x_samples, y_samples, batch_size, self.num_target_tokens)
+
     def generate_batch(self, x_samples, y_samples, batch_size):
-        num_batches = len(x_samples) // batch_size
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size)
         while True:
-            for batchIdx in range(0, num_batches):
-                start = batchIdx * batch_size
-                end = (batchIdx + 1) * batch_size
-                encoder_input_data_batch = pad_sequences(x_samples[start:end], self.max_input_seq_length)
-                decoder_target_data_batch = np.zeros(
-                    shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                for lineIdx, target_words in enumerate(y_samples[start:end]):
-                    for idx, w in enumerate(target_words):
-                        w2idx = 0  # default [UNK]
-                        if w in self.target_word2idx:
-                            w2idx = self.target_word2idx[w]
-                        if w2idx != 0:
-                            decoder_target_data_batch[lineIdx, idx, w2idx] = 1
-                yield encoder_input_data_batch, decoder_target_data_batch
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -125,13 +132,16 @@ class OneShotRNN(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + OneShotRNN.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None,
+            workers=None, use_multiprocessing=False, prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -149,33 +159,47 @@ class OneShotRNN(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size)
 
-        train_num_batches = len(Xtrain) // batch_size
-        test_num_batches = len(Xtest) // batch_size
-
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
+    def encode_input_text(self, texts):
+        temp = []
+        for line in texts:
+            x = []
+            # stop splitting at max_input_seq_length words instead of tokenizing the whole article
+            for word in line.lower().split(' ', self.max_input_seq_length)[:self.max_input_seq_length]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        return pad_sequences(temp, maxlen=self.max_input_seq_length)
+
     def summarize(self, input_text):
-        input_seq = []
-        input_wids = []
-        for word in input_text.lower().split(' '):
-            idx = 1  # default [UNK]
-            if word in self.input_word2idx:
-                idx = self.input_word2idx[word]
-            input_wids.append(idx)
-        input_seq.append(input_wids)
-        input_seq = pad_sequences(input_seq, self.max_input_seq_length)
-        predicted = self.model.predict(input_seq)
-        predicted_word_idx_list = np.argmax(predicted, axis=1)
-        predicted_word_list = [self.target_idx2word[wid] for wid in predicted_word_idx_list[0]]
-        return predicted_word_list
+        return self.summarize_batch([input_text])[0]
+
+    def summarize_batch(self, texts, batch_size=None):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        target_texts = []
+        for start in range(0, len(texts), batch_size):
+            input_seq = self.encode_input_text(texts[start:start + batch_size])
+            # the whole summary of every article comes out of one forward pass: (batch_size, max_target_seq_length,
+            # num_target_tokens), of which the most likely word is taken at every position
+            predicted = self.model.predict(input_seq, batch_size=len(input_seq))
+            predicted_wids = trim_at_end_token(np.argmax(predicted, axis=-1), end_token_idx)
+            for wids in predicted_wids:
+                target_texts.append(' '.join([self.target_idx2word[wid] for wid in wids if wid != start_token_idx]))
+        return target_texts
 
 
 class RecursiveRNN1(object):
@@ -209,6 +233,14 @@ class RecursiveRNN1(object):
             self.version = config['version']
         else:
             self.version = 0
+        self.prefetch_stats = create_prefetch_stats()
+        self.decode_stats = create_decode_stats()
+
+        # next word ids instead of one-hot labels, [UNK] labels are masked out through sample weights
+        self.sparse_targets = False
+        if 'sparse_targets' in config:
+            self.sparse_targets = config['sparse_targets']
+
         self.config = config
 
         print('max_input_seq_length', self.max_input_seq_length)
@@ -216,27 +248,47 @@ class RecursiveRNN1(object):
         print('num_input_tokens', self.num_input_tokens)
         print('num_target_tokens', self.num_target_tokens)
 
-        inputs1 = Input(shape=(self.max_input_seq_length,))
-        am1 = Embedding(self.num_input_tokens, 128)(inputs1)
+        # the padding (id 0) is masked, so that batches padded to their own length (bucket_boundaries) and the
+        # inputs of summarize() padded to another length give the same article and summary vectors; in the summary
+        # prefix id 0 is also [UNK], which is masked like the padding
+        inputs1 = Input(shape=(None,))
+        am1 = Embedding(self.num_input_tokens, 128, mask_zero=True)(inputs1)
         am2 = LSTM(128)(am1)
 
-        inputs2 = Input(shape=(self.max_target_seq_length,))
-        sm1 = Embedding(self.num_target_tokens, 128)(inputs2)
+        inputs2 = Input(shape=(None,))
+        sm1 = Embedding(self.num_target_tokens, 128, mask_zero=True)(inputs2)
         sm2 = LSTM(128)(sm1)
 
         decoder1 = concatenate([am2, sm2])
-        outputs = Dense(self.num_target_tokens, activation='softmax')(decoder1)
+        decoder_dense = Dense(self.num_target_tokens, activation='softmax')
+        outputs = decoder_dense(decoder1)
 
         model = Model(inputs=[inputs1, inputs2], outputs=outputs)
 
-        model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        if self.sparse_targets:
+            model.compile(loss='sparse_categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        else:
+            model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
         self.model = model
 
+        # the article vector does not change while a summary is generated, so summarize() computes it once with
+        # article_encoder_model and then runs only the summary part of the model per word with step_model; both
+        # share their layers with model
+        self.article_encoder_model = Model(inputs1, am2)
+        article_vector_inputs = Input(shape=(128,))
+        step_outputs = decoder_dense(concatenate([article_vector_inputs, sm2]))
+        self.step_model = Model(inputs=[article_vector_inputs, inputs2], outputs=step_outputs)
+
     def load_weights(self, weight_file_path):
         if os.path.exists(weight_file_path):
             self.model.load_weights(weight_file_path)
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_input_seq_length, num_tokens=self.num_input_tokens, unknown_id=1)
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -253,7 +305,30 @@ class RecursiveRNN1(object):
         print(temp.shape)
         return temp
 
+    def encode_input_text(self, texts):
+        temp = []
+        for line in texts:
+            x = []
+            # stop splitting at max_input_seq_length words instead of tokenizing the whole article
+            for word in line.lower().split(' ', self.max_input_seq_length)[:self.max_input_seq_length]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        # the padding is masked in the article model, so the articles are padded only up to the longest text of the
+        # batch
+        return pad_sequences(temp, maxlen=max([len(x) for x in temp] + [1]))
+
     def split_target_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = []
+            for x in texts.to_word_lists():
+                if len(x) + 1 >= self.max_target_seq_length:
+                    x = x[:self.max_target_seq_length - 1] + ['END']
+                temp.append(x)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -266,42 +341,18 @@ class RecursiveRNN1(object):
             temp.append(x)
         return temp
 
-    def generate_batch(self, x_samples, y_samples, batch_size):
-        encoder_input_data_batch = []
-        decoder_input_data_batch = []
-        decoder_target_data_batch = []
-        line_idx = 0
+    def create_batch_sequence(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        return RecursiveBatchSequence(x_samples, y_samples, batch_size, self.target_word2idx,
+                                      self.num_target_tokens, self.max_target_seq_length,
+                                      bucket_boundaries=bucket_boundaries, sparse_targets=self.sparse_targets)
+
+    def generate_batch(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size,
+                                                    bucket_boundaries=bucket_boundaries)
         while True:
-            for recordIdx in range(0, len(x_samples)):
-                target_words = y_samples[recordIdx]
-                x = x_samples[recordIdx]
-                decoder_input_line = []
-
-                for idx in range(0, len(target_words)-1):
-                    w2idx = 0  # default [UNK]
-                    w = target_words[idx]
-                    if w in self.target_word2idx:
-                        w2idx = self.target_word2idx[w]
-                    decoder_input_line = decoder_input_line + [w2idx]
-                    decoder_target_label = np.zeros(self.num_target_tokens)
-                    w2idx_next = 0
-                    if target_words[idx+1] in self.target_word2idx:
-                        w2idx_next = self.target_word2idx[target_words[idx+1]]
-                    if w2idx_next != 0:
-                        decoder_target_label[w2idx_next] = 1
-                    decoder_input_data_batch.append(decoder_input_line)
-                    encoder_input_data_batch.append(x)
-                    decoder_target_data_batch.append(decoder_target_label)
-
-                    line_idx += 1
-                    if line_idx >= batch_size:
-                        yield [pad_sequences(encoder_input_data_batch, self.max_input_seq_length),
-                               pad_sequences(decoder_input_data_batch,
-                                             self.max_target_seq_length)], np.array(decoder_target_data_batch)
-                        line_idx = 0
-                        encoder_input_data_batch = []
-                        decoder_input_data_batch = []
-                        decoder_target_data_batch = []
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -315,13 +366,17 @@ class RecursiveRNN1(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + RecursiveRNN1.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None,
+            bucket_boundaries=None, workers=None, use_multiprocessing=False,
+            prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -339,52 +394,57 @@ class RecursiveRNN1(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
-
-        total_training_samples = sum([len(target_text)-1 for target_text in Ytrain])
-        total_testing_samples = sum([len(target_text)-1 for target_text in Ytest])
-        train_num_batches = total_training_samples // batch_size
-        test_num_batches = total_testing_samples // batch_size
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size, bucket_boundaries=bucket_boundaries)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size, bucket_boundaries=bucket_boundaries)
 
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
     def summarize(self, input_text):
-        input_seq = []
-        input_wids = []
-        for word in input_text.lower().split(' '):
-            idx = 1  # default [UNK]
-            if word in self.input_word2idx:
-                idx = self.input_word2idx[word]
-            input_wids.append(idx)
-        input_seq.append(input_wids)
-        input_seq = pad_sequences(input_seq, self.max_input_seq_length)
-        start_token = self.target_word2idx['START']
-        wid_list = [start_token]
-        sum_input_seq = pad_sequences([wid_list], self.max_target_seq_length)
-        terminated = False
-
-        target_text = ''
-
-        while not terminated:
-            output_tokens = self.model.predict([input_seq, sum_input_seq])
+        input_seq = self.encode_input_text([input_text])
+        article_vector = self.article_encoder_model.predict(input_seq)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        # the summary prefix is shifted left in place, which is what pad_sequences() of the growing word list gives
+        sum_input_seq = np.zeros((1, self.max_target_seq_length), dtype=np.int32)
+        sum_input_seq[0, -1] = start_token_idx
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        while True:
+            output_tokens = self.step_model.predict([article_vector, sum_input_seq])
             sample_token_idx = np.argmax(output_tokens[0, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            wid_list = wid_list + [sample_token_idx]
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
 
-            if sample_word != 'START' and sample_word != 'END':
-                target_text += ' ' + sample_word
+            if num_wids + 1 >= self.max_target_seq_length:
+                break
+            sum_input_seq[0, :-1] = sum_input_seq[0, 1:]
+            sum_input_seq[0, -1] = sample_token_idx
+        return ' '.join([self.target_idx2word[wid] for wid in wids[:num_wids].tolist() if wid != start_token_idx])
 
-            if sample_word == 'END' or len(wid_list) >= self.max_target_seq_length:
-                terminated = True
-            else:
-                sum_input_seq = pad_sequences([wid_list], self.max_target_seq_length)
-        return target_text.strip()
+    def predict_step(self, article_vectors, sum_input_seq):
+        return self.step_model.predict([article_vectors, sum_input_seq], batch_size=len(sum_input_seq))
+
+    def summarize_batch(self, texts, batch_size=None):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = []
+        for start in range(0, len(texts), batch_size):
+            input_seq = self.encode_input_text(texts[start:start + batch_size])
+            article_vectors = self.article_encoder_model.predict(input_seq, batch_size=len(input_seq))
+            predicted_wids = prefix_greedy_decode(self.predict_step, article_vectors, self.target_word2idx['START'],
+                                                  self.target_word2idx['END'], self.max_target_seq_length,
+                                                  self.max_target_seq_length, stats=self.decode_stats)
+            for wids in predicted_wids:
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts.append(' '.join([word for word in words if word != 'START']).strip())
+        return target_texts
 
 
 class RecursiveRNN2(object):
@@ -416,6 +476,13 @@ class RecursiveRNN2(object):
         self.version = 0
         if 'version' in config:
             self.version = config['version']
+        self.prefetch_stats = create_prefetch_stats()
+        self.decode_stats = create_decode_stats()
+
+        # next word ids instead of one-hot labels, [UNK] labels are masked out through sample weights
+        self.sparse_targets = False
+        if 'sparse_targets' in config:
+            self.sparse_targets = config['sparse_targets']
 
         # article input model
         inputs1 = Input(shape=(self.max_input_seq_length,))
@@ -435,7 +502,10 @@ class RecursiveRNN2(object):
         outputs = Dense(self.num_target_tokens, activation='softmax')(decoder2)
         # tie it together [article, summary] [word]
         model = Model(inputs=[inputs1, inputs2], outputs=outputs)
-        model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        if self.sparse_targets:
+            model.compile(loss='sparse_categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        else:
+            model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
 
         print(model.summary())
 
@@ -447,6 +517,11 @@ class RecursiveRNN2(object):
             self.model.load_weights(weight_file_path)
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_input_seq_length, num_tokens=self.num_input_tokens, unknown_id=1)
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -463,7 +538,30 @@ class RecursiveRNN2(object):
         print(temp.shape)
         return temp
 
+    def encode_input_text(self, texts):
+        temp = []
+        for line in texts:
+            x = []
+            # stop splitting at max_input_seq_length words instead of tokenizing the whole article
+            for word in line.lower().split(' ', self.max_input_seq_length)[:self.max_input_seq_length]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        # the padding is not masked in the article model, so the articles are padded to max_input_seq_length as in
+        # training
+        return pad_sequences(temp, maxlen=self.max_input_seq_length)
+
     def split_target_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = []
+            for x in texts.to_word_lists():
+                if len(x) + 1 >= self.max_target_seq_length:
+                    x = x[:self.max_target_seq_length - 1] + ['END']
+                temp.append(x)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -476,43 +574,18 @@ class RecursiveRNN2(object):
             temp.append(x)
         return temp
 
+    def create_batch_sequence(self, x_samples, y_samples, batch_size):
+        return RecursiveBatchSequence(x_samples, y_samples, batch_size, self.target_word2idx,
+                                      self.num_target_tokens,
+                                      min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH),
+                                      sparse_targets=self.sparse_targets)
+
     def generate_batch(self, x_samples, y_samples, batch_size):
-        encoder_input_data_batch = []
-        decoder_input_data_batch = []
-        decoder_target_data_batch = []
-        line_idx = 0
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size)
         while True:
-            for recordIdx in range(0, len(x_samples)):
-                target_words = y_samples[recordIdx]
-                x = x_samples[recordIdx]
-                decoder_input_line = []
-
-                for idx in range(0, len(target_words)-1):
-                    w2idx = 0  # default [UNK]
-                    w = target_words[idx]
-                    if w in self.target_word2idx:
-                        w2idx = self.target_word2idx[w]
-                    decoder_input_line = decoder_input_line + [w2idx]
-                    decoder_target_label = np.zeros(self.num_target_tokens)
-                    w2idx_next = 0
-                    if target_words[idx+1] in self.target_word2idx:
-                        w2idx_next = self.target_word2idx[target_words[idx+1]]
-                    if w2idx_next != 0:
-                        decoder_target_label[w2idx_next] = 1
-
-                    decoder_input_data_batch.append(decoder_input_line)
-                    encoder_input_data_batch.append(x)
-                    decoder_target_data_batch.append(decoder_target_label)
-
-                    line_idx += 1
-                    if line_idx >= batch_size:
-                        yield [pad_sequences(encoder_input_data_batch, self.max_input_seq_length),
-                               pad_sequences(decoder_input_data_batch,
-                                             min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH))], np.array(decoder_target_data_batch)
-                        line_idx = 0
-                        encoder_input_data_batch = []
-                        decoder_input_data_batch = []
-                        decoder_target_data_batch = []
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -526,13 +599,16 @@ class RecursiveRNN2(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + RecursiveRNN2.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None,
+            workers=None, use_multiprocessing=False, prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -550,52 +626,56 @@ class RecursiveRNN2(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
-
-        total_training_samples = sum([len(target_text)-1 for target_text in Ytrain])
-        total_testing_samples = sum([len(target_text)-1 for target_text in Ytest])
-        train_num_batches = total_training_samples // batch_size
-        test_num_batches = total_testing_samples // batch_size
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size)
 
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
     def summarize(self, input_text):
-        input_seq = []
-        input_wids = []
-        for word in input_text.lower().split(' '):
-            idx = 1  # default [UNK]
-            if word in self.input_word2idx:
-                idx = self.input_word2idx[word]
-            input_wids.append(idx)
-        input_seq.append(input_wids)
-        input_seq = pad_sequences(input_seq, self.max_input_seq_length)
-        start_token = self.target_word2idx['START']
-        wid_list = [start_token]
-        sum_input_seq = pad_sequences([wid_list], min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH))
-        terminated = False
-
-        target_text = ''
-
-        while not terminated:
+        input_seq = self.encode_input_text([input_text])
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        # the summary prefix is shifted left in place, which is what pad_sequences() of the growing word list gives
+        sum_input_seq = np.zeros((1, min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH)), dtype=np.int32)
+        sum_input_seq[0, -1] = start_token_idx
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        while True:
             output_tokens = self.model.predict([input_seq, sum_input_seq])
             sample_token_idx = np.argmax(output_tokens[0, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            wid_list = wid_list + [sample_token_idx]
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
 
-            if sample_word != 'START' and sample_word != 'END':
-                target_text += ' ' + sample_word
+            if num_wids + 1 >= self.max_target_seq_length:
+                break
+            sum_input_seq[0, :-1] = sum_input_seq[0, 1:]
+            sum_input_seq[0, -1] = sample_token_idx
+        return ' '.join([self.target_idx2word[wid] for wid in wids[:num_wids].tolist() if wid != start_token_idx])
 
-            if sample_word == 'END' or len(wid_list) >= self.max_target_seq_length:
-                terminated = True
-            else:
-                sum_input_seq = pad_sequences([wid_list], min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH))
-        return target_text.strip()
+    def predict_step(self, input_seq, sum_input_seq):
+        return self.model.predict([input_seq, sum_input_seq], batch_size=len(sum_input_seq))
+
+    def summarize_batch(self, texts, batch_size=None):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = []
+        for start in range(0, len(texts), batch_size):
+            input_seq = self.encode_input_text(texts[start:start + batch_size])
+            predicted_wids = prefix_greedy_decode(self.predict_step, input_seq, self.target_word2idx['START'],
+                                                  self.target_word2idx['END'], self.max_target_seq_length,
+                                                  min(self.num_target_tokens, RecursiveRNN2.MAX_DECODER_SEQ_LENGTH),
+                                                  stats=self.decode_stats)
+            for wids in predicted_wids:
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts.append(' '.join([word for word in words if word != 'START']).strip())
+        return target_texts
 
 
 class RecursiveRNN3(object):
@@ -625,35 +705,66 @@ class RecursiveRNN3(object):
         self.version = 0
         if 'version' in config:
             self.version = config['version']
+        self.prefetch_stats = create_prefetch_stats()
+        self.decode_stats = create_decode_stats()
+
+        # next word ids instead of one-hot labels, [UNK] labels are masked out through sample weights
+        self.sparse_targets = False
+        if 'sparse_targets' in config:
+            self.sparse_targets = config['sparse_targets']
+
+        # the padding (id 0) is masked, so that batches padded to their own length (bucket_boundaries) and the
+        # inputs of summarize() padded to another length give the same article and summary vectors; in the summary
+        # prefix id 0 is also [UNK], which is masked like the padding
 
         # article input model
-        inputs1 = Input(shape=(self.max_input_seq_length,))
-        article1 = Embedding(self.num_input_tokens, 128)(inputs1)
+        inputs1 = Input(shape=(None,))
+        article1 = Embedding(self.num_input_tokens, 128, mask_zero=True)(inputs1)
         article2 = LSTM(128)(article1)
-        article3 = RepeatVector(128)(article2)
+        article_repeat = RepeatVector(128)
+        article3 = article_repeat(article2)
         # summary input model
-        inputs2 = Input(shape=(self.max_target_seq_length,))
-        summ1 = Embedding(self.num_target_tokens, 128)(inputs2)
+        inputs2 = Input(shape=(None,))
+        summ1 = Embedding(self.num_target_tokens, 128, mask_zero=True)(inputs2)
         summ2 = LSTM(128)(summ1)
         summ3 = RepeatVector(128)(summ2)
         # decoder model
         decoder1 = concatenate([article3, summ3])
-        decoder2 = LSTM(128)(decoder1)
-        outputs = Dense(self.num_target_tokens, activation='softmax')(decoder2)
+        decoder_lstm = LSTM(128)
+        decoder2 = decoder_lstm(decoder1)
+        decoder_dense = Dense(self.num_target_tokens, activation='softmax')
+        outputs = decoder_dense(decoder2)
         # tie it together [article, summary] [word]
         model = Model(inputs=[inputs1, inputs2], outputs=outputs)
-        model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        if self.sparse_targets:
+            model.compile(loss='sparse_categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+        else:
+            model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
 
         print(model.summary())
 
         self.model = model
 
+        # the article vector does not change while a summary is generated, so summarize() computes it once with
+        # article_encoder_model and then runs only the summary and decoder part of the model per word with
+        # step_model; both share their layers with model
+        self.article_encoder_model = Model(inputs1, article2)
+        article_vector_inputs = Input(shape=(128,))
+        step_decoder1 = concatenate([article_repeat(article_vector_inputs), summ3])
+        step_outputs = decoder_dense(decoder_lstm(step_decoder1))
+        self.step_model = Model(inputs=[article_vector_inputs, inputs2], outputs=step_outputs)
+
     def load_weights(self, weight_file_path):
         if os.path.exists(weight_file_path):
             print('loading weights from ', weight_file_path)
             self.model.load_weights(weight_file_path)
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_input_seq_length, num_tokens=self.num_input_tokens, unknown_id=1)
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -670,7 +781,30 @@ class RecursiveRNN3(object):
         print(temp.shape)
         return temp
 
+    def encode_input_text(self, texts):
+        temp = []
+        for line in texts:
+            x = []
+            # stop splitting at max_input_seq_length words instead of tokenizing the whole article
+            for word in line.lower().split(' ', self.max_input_seq_length)[:self.max_input_seq_length]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        # the padding is masked in the article model, so the articles are padded only up to the longest text of the
+        # batch
+        return pad_sequences(temp, maxlen=max([len(x) for x in temp] + [1]))
+
     def split_target_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = []
+            for x in texts.to_word_lists():
+                if len(x) + 1 >= self.max_target_seq_length:
+                    x = x[:self.max_target_seq_length - 1] + ['END']
+                temp.append(x)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -683,43 +817,18 @@ class RecursiveRNN3(object):
             temp.append(x)
         return temp
 
-    def generate_batch(self, x_samples, y_samples, batch_size):
-        encoder_input_data_batch = []
-        decoder_input_data_batch = []
-        decoder_target_data_batch = []
-        line_idx = 0
+    def create_batch_sequence(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        return RecursiveBatchSequence(x_samples, y_samples, batch_size, self.target_word2idx,
+                                      self.num_target_tokens, self.max_target_seq_length,
+                                      bucket_boundaries=bucket_boundaries, sparse_targets=self.sparse_targets)
+
+    def generate_batch(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size,
+                                                    bucket_boundaries=bucket_boundaries)
         while True:
-            for recordIdx in range(0, len(x_samples)):
-                target_words = y_samples[recordIdx]
-                x = x_samples[recordIdx]
-                decoder_input_line = []
-
-                for idx in range(0, len(target_words)-1):
-                    w2idx = 0  # default [UNK]
-                    w = target_words[idx]
-                    if w in self.target_word2idx:
-                        w2idx = self.target_word2idx[w]
-                    decoder_input_line = decoder_input_line + [w2idx]
-                    decoder_target_label = np.zeros(self.num_target_tokens)
-                    w2idx_next = 0
-                    if target_words[idx+1] in self.target_word2idx:
-                        w2idx_next = self.target_word2idx[target_words[idx+1]]
-                    if w2idx_next != 0:
-                        decoder_target_label[w2idx_next] = 1
-
-                    decoder_input_data_batch.append(decoder_input_line)
-                    encoder_input_data_batch.append(x)
-                    decoder_target_data_batch.append(decoder_target_label)
-
-                    line_idx += 1
-                    if line_idx >= batch_size:
-                        yield [pad_sequences(encoder_input_data_batch, self.max_input_seq_length),
-                               pad_sequences(decoder_input_data_batch,
-                                             self.max_target_seq_length)], np.array(decoder_target_data_batch)
-                        line_idx = 0
-                        encoder_input_data_batch = []
-                        decoder_input_data_batch = []
-                        decoder_target_data_batch = []
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -733,13 +842,17 @@ class RecursiveRNN3(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + RecursiveRNN2.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, model_dir_path=None, batch_size=None,
+            bucket_boundaries=None, workers=None, use_multiprocessing=False,
+            prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -757,49 +870,54 @@ class RecursiveRNN3(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
-
-        total_training_samples = sum([len(target_text)-1 for target_text in Ytrain])
-        total_testing_samples = sum([len(target_text)-1 for target_text in Ytest])
-        train_num_batches = total_training_samples // batch_size
-        test_num_batches = total_testing_samples // batch_size
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size, bucket_boundaries=bucket_boundaries)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size, bucket_boundaries=bucket_boundaries)
 
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
     def summarize(self, input_text):
-        input_seq = []
-        input_wids = []
-        for word in input_text.lower().split(' '):
-            idx = 1  # default [UNK]
-            if word in self.input_word2idx:
-                idx = self.input_word2idx[word]
-            input_wids.append(idx)
-        input_seq.append(input_wids)
-        input_seq = pad_sequences(input_seq, self.max_input_seq_length)
-        start_token = self.target_word2idx['START']
-        wid_list = [start_token]
-        sum_input_seq = pad_sequences([wid_list], self.max_target_seq_length)
-        terminated = False
-
-        target_text = ''
-
-        while not terminated:
-            output_tokens = self.model.predict([input_seq, sum_input_seq])
+        input_seq = self.encode_input_text([input_text])
+        article_vector = self.article_encoder_model.predict(input_seq)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        # the summary prefix is shifted left in place, which is what pad_sequences() of the growing word list gives
+        sum_input_seq = np.zeros((1, self.max_target_seq_length), dtype=np.int32)
+        sum_input_seq[0, -1] = start_token_idx
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        while True:
+            output_tokens = self.step_model.predict([article_vector, sum_input_seq])
             sample_token_idx = np.argmax(output_tokens[0, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            wid_list = wid_list + [sample_token_idx]
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
+
+            if num_wids + 1 >= self.max_target_seq_length:
+                break
+            sum_input_seq[0, :-1] = sum_input_seq[0, 1:]
+            sum_input_seq[0, -1] = sample_token_idx
+        return ' '.join([self.target_idx2word[wid] for wid in wids[:num_wids].tolist() if wid != start_token_idx])
 
-            if sample_word != 'START' and sample_word != 'END':
-                target_text += ' ' + sample_word
+    def predict_step(self, article_vectors, sum_input_seq):
+        return self.step_model.predict([article_vectors, sum_input_seq], batch_size=len(sum_input_seq))
 
-            if sample_word == 'END' or len(wid_list) >= self.max_target_seq_length:
-                terminated = True
-            else:
-                sum_input_seq = pad_sequences([wid_list], self.max_target_seq_length)
-        return target_text.strip()
+    def summarize_batch(self, texts, batch_size=None):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = []
+        for start in range(0, len(texts), batch_size):
+            input_seq = self.encode_input_text(texts[start:start + batch_size])
+            article_vectors = self.article_encoder_model.predict(input_seq, batch_size=len(input_seq))
+            predicted_wids = prefix_greedy_decode(self.predict_step, article_vectors, self.target_word2idx['START'],
+                                                  self.target_word2idx['END'], self.max_target_seq_length,
+                                                  self.max_target_seq_length, stats=self.decode_stats)
+            for wids in predicted_wids:
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts.append(' '.join([word for word in words if word != 'START']).strip())
+        return target_texts
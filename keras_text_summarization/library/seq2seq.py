@@ -1,11 +1,19 @@
 from __future__ import print_function
 
 from keras.models import Model
-from keras.layers import Embedding, Dense, Input
+from keras.layers import Embedding, Dense, Input, Masking
 from keras.layers.recurrent import LSTM
 from keras.preprocessing.sequence import pad_sequences
 from keras.callbacks import ModelCheckpoint
+from keras import backend as K
 from keras_text_summarization.library.utility.glove_loader import load_glove, GLOVE_EMBEDDING_SIZE
+from keras_text_summarization.library.utility.decode_utils import greedy_decode, beam_search_decode, create_decode_stats
+from keras_text_summarization.library.utility.decode_utils import build_greedy_decode_graph, trim_at_end_token
+from keras_text_summarization.library.utility.batch_utils import length_sorted_batches
+from keras_text_summarization.library.utility.sequence_utils import Seq2SeqBatchSequence
+from keras_text_summarization.library.utility.prefetch_utils import create_prefetch_stats, fit_sequences
+from keras_text_summarization.library.utility.prefetch_utils import num_prefetch_buffers
+from keras_text_summarization.library.utility.corpus_utils import EncodedTexts, PaddedTexts
 import numpy as np
 import os
 
@@ -13,6 +21,8 @@ HIDDEN_UNITS = 100
 DEFAULT_BATCH_SIZE = 64
 VERBOSE = 1
 DEFAULT_EPOCHS = 10
+DEFAULT_WORKERS = 1
+DEFAULT_BATCH_DTYPE = 'float32'
 
 
 class Seq2SeqSummarizer(object):
@@ -34,39 +44,77 @@ class Seq2SeqSummarizer(object):
         if 'version' in config:
             self.version = config['version']
 
+        # decoder inputs as token ids through an Embedding layer and sparse targets instead of one-hot tensors
+        self.sparse_targets = False
+        if 'sparse_targets' in config:
+            self.sparse_targets = config['sparse_targets']
+
+        # dtype of the one-hot vectors of the training batches, e.g. 'uint8' to save memory
+        self.batch_dtype = DEFAULT_BATCH_DTYPE
+        if 'batch_dtype' in config:
+            self.batch_dtype = config['batch_dtype']
+
+        self.decode_stats = create_decode_stats()
+        self.prefetch_stats = create_prefetch_stats()
+
         encoder_inputs = Input(shape=(None,), name='encoder_inputs')
+        # PAD (id 0) is masked, so the encoder runs over articles of any length without seeing the padding
         encoder_embedding = Embedding(input_dim=self.num_input_tokens, output_dim=HIDDEN_UNITS,
-                                      input_length=self.max_input_seq_length, name='encoder_embedding')
+                                      input_length=self.max_input_seq_length, mask_zero=True,
+                                      name='encoder_embedding')
         encoder_lstm = LSTM(units=HIDDEN_UNITS, return_state=True, name='encoder_lstm')
         encoder_outputs, encoder_state_h, encoder_state_c = encoder_lstm(encoder_embedding(encoder_inputs))
         encoder_states = [encoder_state_h, encoder_state_c]
 
-        decoder_inputs = Input(shape=(None, self.num_target_tokens), name='decoder_inputs')
+        if self.sparse_targets:
+            decoder_inputs = Input(shape=(None,), name='decoder_inputs')
+            decoder_embedding = Embedding(input_dim=self.num_target_tokens, output_dim=HIDDEN_UNITS,
+                                          name='decoder_embedding')
+            decoder_lstm_inputs = decoder_embedding(decoder_inputs)
+        else:
+            decoder_inputs = Input(shape=(None, self.num_target_tokens), name='decoder_inputs')
+            decoder_embedding = None
+            decoder_lstm_inputs = decoder_inputs
         decoder_lstm = LSTM(units=HIDDEN_UNITS, return_state=True, return_sequences=True, name='decoder_lstm')
-        decoder_outputs, decoder_state_h, decoder_state_c = decoder_lstm(decoder_inputs,
+        decoder_outputs, decoder_state_h, decoder_state_c = decoder_lstm(decoder_lstm_inputs,
                                                                          initial_state=encoder_states)
         decoder_dense = Dense(units=self.num_target_tokens, activation='softmax', name='decoder_dense')
         decoder_outputs = decoder_dense(decoder_outputs)
 
         model = Model([encoder_inputs, decoder_inputs], decoder_outputs)
 
-        model.compile(loss='categorical_crossentropy', optimizer='rmsprop', metrics=['accuracy'])
+        if self.sparse_targets:
+            # padding and [UNK] targets are masked out through temporal sample weights
+            model.compile(loss='sparse_categorical_crossentropy', optimizer='rmsprop', metrics=['accuracy'],
+                          sample_weight_mode='temporal')
+        else:
+            model.compile(loss='categorical_crossentropy', optimizer='rmsprop', metrics=['accuracy'])
 
         self.model = model
 
         self.encoder_model = Model(encoder_inputs, encoder_states)
 
         decoder_state_inputs = [Input(shape=(HIDDEN_UNITS,)), Input(shape=(HIDDEN_UNITS,))]
-        decoder_outputs, state_h, state_c = decoder_lstm(decoder_inputs, initial_state=decoder_state_inputs)
+        decoder_outputs, state_h, state_c = decoder_lstm(decoder_lstm_inputs, initial_state=decoder_state_inputs)
         decoder_states = [state_h, state_c]
         decoder_outputs = decoder_dense(decoder_outputs)
         self.decoder_model = Model([decoder_inputs] + decoder_state_inputs, [decoder_outputs] + decoder_states)
 
+        self.decoder_embedding = decoder_embedding
+        self.decoder_lstm = decoder_lstm
+        self.decoder_dense = decoder_dense
+        self.graph_decoder = None
+
     def load_weights(self, weight_file_path):
         if os.path.exists(weight_file_path):
             self.model.load_weights(weight_file_path)
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_input_seq_length, num_tokens=self.num_input_tokens, unknown_id=1)
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = []
@@ -83,40 +131,50 @@ class Seq2SeqSummarizer(object):
         print(temp.shape)
         return temp
 
-    def transform_target_encoding(self, texts):
+    def encode_input_text(self, texts):
         temp = []
         for line in texts:
             x = []
+            # stop splitting at max_input_seq_length words instead of tokenizing the whole article
+            for word in line.lower().split(' ', self.max_input_seq_length)[:self.max_input_seq_length]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        # padded only up to the longest text of the batch
+        return pad_sequences(temp, maxlen=max([len(x) for x in temp] + [1]))
+
+    def transform_target_encoding(self, texts):
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_target_seq_length, padding='post', num_tokens=self.num_target_tokens)
+            print(temp.shape)
+            return temp
+
+        temp = np.zeros(shape=(len(texts), self.max_target_seq_length), dtype=np.int32)
+        for lineIdx, line in enumerate(texts):
             line2 = 'START ' + line.lower() + ' END'
-            for word in line2.split(' '):
-                x.append(word)
-                if len(x) >= self.max_target_seq_length:
+            for idx, word in enumerate(line2.split(' ')):
+                if idx >= self.max_target_seq_length:
                     break
-            temp.append(x)
+                if word in self.target_word2idx:
+                    temp[lineIdx, idx] = self.target_word2idx[word]  # default [UNK] is 0
 
-        temp = np.array(temp)
         print(temp.shape)
         return temp
 
-    def generate_batch(self, x_samples, y_samples, batch_size):
-        num_batches = len(x_samples) // batch_size
+    def create_batch_sequence(self, x_samples, y_samples, batch_size, bucket_boundaries=None, num_buffers=None):
+        return Seq2SeqBatchSequence(x_samples, y_samples, batch_size, self.num_target_tokens,
+                                    bucket_boundaries=bucket_boundaries, input_padding='pre',
+                                    sparse_targets=self.sparse_targets, dtype=self.batch_dtype, num_buffers=num_buffers)
+
+    def generate_batch(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size,
+                                                    bucket_boundaries=bucket_boundaries)
         while True:
-            for batchIdx in range(0, num_batches):
-                start = batchIdx * batch_size
-                end = (batchIdx + 1) * batch_size
-                encoder_input_data_batch = pad_sequences(x_samples[start:end], self.max_input_seq_length)
-                decoder_target_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                decoder_input_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                for lineIdx, target_words in enumerate(y_samples[start:end]):
-                    for idx, w in enumerate(target_words):
-                        w2idx = 0  # default [UNK]
-                        if w in self.target_word2idx:
-                            w2idx = self.target_word2idx[w]
-                        if w2idx != 0:
-                            decoder_input_data_batch[lineIdx, idx, w2idx] = 1
-                            if idx > 0:
-                                decoder_target_data_batch[lineIdx, idx - 1, w2idx] = 1
-                yield [encoder_input_data_batch, decoder_input_data_batch], decoder_target_data_batch
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -130,13 +188,17 @@ class Seq2SeqSummarizer(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + Seq2SeqSummarizer.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None,
+            bucket_boundaries=None, workers=None, use_multiprocessing=False,
+            prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -153,53 +215,106 @@ class Seq2SeqSummarizer(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
-
-        train_num_batches = len(Xtrain) // batch_size
-        test_num_batches = len(Xtest) // batch_size
+        num_buffers = num_prefetch_buffers(prefetch)
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size, bucket_boundaries=bucket_boundaries,
+                                               num_buffers=num_buffers)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size, bucket_boundaries=bucket_boundaries,
+                                              num_buffers=num_buffers)
 
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
-    def summarize(self, input_text):
-        input_seq = []
-        input_wids = []
-        for word in input_text.lower().split(' '):
-            idx = 1  # default [UNK]
-            if word in self.input_word2idx:
-                idx = self.input_word2idx[word]
-            input_wids.append(idx)
-        input_seq.append(input_wids)
-        input_seq = pad_sequences(input_seq, self.max_input_seq_length)
+    def summarize(self, input_text, beam_width=None, in_graph=False):
+        if beam_width is not None or in_graph:
+            return self.summarize_batch([input_text], beam_width=beam_width, in_graph=in_graph)[0]
+        input_seq = self.encode_input_text([input_text])
         states_value = self.encoder_model.predict(input_seq)
-        target_seq = np.zeros((1, 1, self.num_target_tokens))
-        target_seq[0, 0, self.target_word2idx['START']] = 1
-        target_text = ''
-        target_text_len = 0
-        terminated = False
-        while not terminated:
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        # the decoder input of a step and the generated ids go into buffers allocated once per summary
+        if self.sparse_targets:
+            target_seq = np.zeros((1, 1), dtype=np.int32)
+            target_seq[0, 0] = start_token_idx
+        else:
+            target_seq = np.zeros((1, 1, self.num_target_tokens))
+            target_seq[0, 0, start_token_idx] = 1
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        prev_token_idx = start_token_idx
+        for step in range(self.max_target_seq_length):
             output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value)
 
             sample_token_idx = np.argmax(output_tokens[0, -1, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            target_text_len += 1
-
-            if sample_word != 'START' and sample_word != 'END':
-                target_text += ' ' + sample_word
-
-            if sample_word == 'END' or target_text_len >= self.max_target_seq_length:
-                terminated = True
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
 
-            target_seq = np.zeros((1, 1, self.num_target_tokens))
-            target_seq[0, 0, sample_token_idx] = 1
+            if self.sparse_targets:
+                target_seq[0, 0] = sample_token_idx
+            else:
+                target_seq[0, 0, prev_token_idx] = 0
+                target_seq[0, 0, sample_token_idx] = 1
+            prev_token_idx = sample_token_idx
 
             states_value = [h, c]
-        return target_text.strip()
+        return ' '.join([self.target_idx2word[wid] for wid in wids[:num_wids].tolist() if wid != start_token_idx])
+
+    def decode_step(self, token_ids, states_value):
+        if self.sparse_targets:
+            target_seq = np.reshape(token_ids, (len(token_ids), 1))
+        else:
+            target_seq = np.zeros((len(token_ids), 1, self.num_target_tokens))
+            target_seq[np.arange(len(token_ids)), 0, token_ids] = 1
+        output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value, batch_size=len(token_ids))
+        return output_tokens[:, -1, :], [h, c]
+
+    def get_graph_decoder(self):
+        if self.graph_decoder is None:
+            def embed_inputs(token_ids):
+                if self.sparse_targets:
+                    return K.gather(self.decoder_embedding.embeddings, token_ids)
+                return K.one_hot(token_ids, self.num_target_tokens)
+
+            token_ids = build_greedy_decode_graph(self.encoder_model.outputs, self.decoder_lstm, self.decoder_dense,
+                                                  embed_inputs, self.target_word2idx['START'],
+                                                  self.target_word2idx['END'], self.max_target_seq_length)
+            self.graph_decoder = K.function(self.encoder_model.inputs, [token_ids])
+        return self.graph_decoder
+
+    def decode_batch(self, input_seq, beam_width=None, in_graph=False):
+        if in_graph and beam_width is not None:
+            raise ValueError('in_graph=True decodes greedily and cannot be combined with beam_width')
+        if beam_width is not None and beam_width < 1:
+            raise ValueError('beam_width must be at least 1, got %s' % beam_width)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        if in_graph:
+            return trim_at_end_token(self.get_graph_decoder()([input_seq])[0], end_token_idx)
+        states_value = self.encoder_model.predict(input_seq, batch_size=len(input_seq))
+        if beam_width is None:
+            return greedy_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                 self.max_target_seq_length, stats=self.decode_stats)
+        return beam_search_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                  self.max_target_seq_length, beam_width, stats=self.decode_stats)
+
+    def summarize_batch(self, texts, batch_size=None, beam_width=None, in_graph=False):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = [None] * len(texts)
+        # texts of similar length are batched together so that little padding is needed
+        input_lengths = [len(text.split(' ', self.max_input_seq_length)) for text in texts]
+        for batch in length_sorted_batches(input_lengths, batch_size):
+            input_seq = self.encode_input_text([texts[lineIdx] for lineIdx in batch])
+            predicted_wids = self.decode_batch(input_seq, beam_width, in_graph)
+            for lineIdx, wids in zip(batch, predicted_wids):
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts[lineIdx] = ' '.join([word for word in words if word != 'START']).strip()
+        return target_texts
 
 
 class Seq2SeqGloVeSummarizer(object):
@@ -216,6 +331,23 @@ class Seq2SeqGloVeSummarizer(object):
         if 'version' in config:
             self.version = config['version']
 
+        # encoder takes word ids and looks up GloVe inside the model through a frozen Embedding layer
+        self.glove_embedding_layer = False
+        if 'glove_embedding_layer' in config:
+            self.glove_embedding_layer = config['glove_embedding_layer']
+        if self.glove_embedding_layer:
+            self.num_input_tokens = config['num_input_tokens']
+            self.input_word2idx = config['input_word2idx']
+            self.input_idx2word = config['input_idx2word']
+
+        # dtype of the one-hot vectors of the training batches, e.g. 'uint8' to save memory
+        self.batch_dtype = DEFAULT_BATCH_DTYPE
+        if 'batch_dtype' in config:
+            self.batch_dtype = config['batch_dtype']
+
+        self.decode_stats = create_decode_stats()
+        self.prefetch_stats = create_prefetch_stats()
+
         self.word2em = dict()
         if 'unknown_emb' in config:
             self.unknown_emb = config['unknown_emb']
@@ -225,9 +357,17 @@ class Seq2SeqGloVeSummarizer(object):
 
         self.config = config
 
-        encoder_inputs = Input(shape=(None, GLOVE_EMBEDDING_SIZE), name='encoder_inputs')
+        if self.glove_embedding_layer:
+            encoder_inputs = Input(shape=(None,), name='encoder_inputs')
+            encoder_embedding = Embedding(input_dim=self.num_input_tokens, output_dim=GLOVE_EMBEDDING_SIZE,
+                                          trainable=False, mask_zero=True, name='encoder_embedding')
+            encoder_lstm_inputs = encoder_embedding(encoder_inputs)
+        else:
+            encoder_inputs = Input(shape=(None, GLOVE_EMBEDDING_SIZE), name='encoder_inputs')
+            encoder_embedding = None
+            encoder_lstm_inputs = Masking(name='encoder_masking')(encoder_inputs)
         encoder_lstm = LSTM(units=HIDDEN_UNITS, return_state=True, name='encoder_lstm')
-        encoder_outputs, encoder_state_h, encoder_state_c = encoder_lstm(encoder_inputs)
+        encoder_outputs, encoder_state_h, encoder_state_c = encoder_lstm(encoder_lstm_inputs)
         encoder_states = [encoder_state_h, encoder_state_c]
 
         decoder_inputs = Input(shape=(None, self.num_target_tokens), name='decoder_inputs')
@@ -251,14 +391,81 @@ class Seq2SeqGloVeSummarizer(object):
         decoder_outputs = decoder_dense(decoder_outputs)
         self.decoder_model = Model([decoder_inputs] + decoder_state_inputs, [decoder_outputs] + decoder_states)
 
+        self.encoder_embedding = encoder_embedding
+        self.decoder_lstm = decoder_lstm
+        self.decoder_dense = decoder_dense
+        self.graph_decoder = None
+
     def load_weights(self, weight_file_path):
         if os.path.exists(weight_file_path):
             self.model.load_weights(weight_file_path)
 
-    def load_glove(self, data_dir_path):
-        self.word2em = load_glove(data_dir_path)
+    def load_glove(self, data_dir_path, vocab=None):
+        self.word2em = load_glove(data_dir_path, vocab=vocab)
+        if self.glove_embedding_layer:
+            self.encoder_embedding.set_weights([self.get_input_embedding_matrix()])
+
+    def get_input_embedding_matrix(self):
+        input_embeddings = np.zeros(shape=(self.num_input_tokens, GLOVE_EMBEDDING_SIZE), dtype=np.float32)
+        for idx, word in self.input_idx2word.items():
+            emb = self.unknown_emb
+            if word in self.word2em:
+                emb = self.word2em[word]
+            input_embeddings[idx, :] = emb
+        input_embeddings[self.input_word2idx['PAD'], :] = 0
+        input_embeddings[self.input_word2idx['UNK'], :] = self.unknown_emb
+        return input_embeddings
+
+    def transform_input_ids(self, texts, maxlen=None):
+        if maxlen is None:
+            maxlen = self.max_input_seq_length
+        if isinstance(texts, EncodedTexts):
+            return PaddedTexts(texts, maxlen, padding='post', num_tokens=self.num_input_tokens, unknown_id=1)
+        temp = []
+        for line in texts:
+            x = []
+            for word in line.lower().split(' ', maxlen)[:maxlen]:
+                wid = 1  # default [UNK]
+                if word in self.input_word2idx:
+                    wid = self.input_word2idx[word]
+                x.append(wid)
+            temp.append(x)
+        # padded at the end, like the zero rows after the words of the GloVe tensors
+        return pad_sequences(temp, maxlen=maxlen, padding='post')
+
+    def encode_input_text(self, texts):
+        # padded only up to the longest text of the batch, the padding is masked out in the encoder
+        input_seq_length = max([len(text.split(' ', self.max_input_seq_length)) for text in texts] + [1])
+        input_seq_length = min(input_seq_length, self.max_input_seq_length)
+        if self.glove_embedding_layer:
+            return self.transform_input_ids(texts, maxlen=input_seq_length)
+        input_seq = np.zeros(shape=(len(texts), input_seq_length, GLOVE_EMBEDDING_SIZE))
+        for lineIdx, input_text in enumerate(texts):
+            for idx, word in enumerate(input_text.lower().split(' ', input_seq_length)[:input_seq_length]):
+                emb = self.unknown_emb  # default [UNK]
+                if word in self.word2em:
+                    emb = self.word2em[word]
+                input_seq[lineIdx, idx, :] = emb
+        return input_seq
 
     def transform_input_text(self, texts):
+        if self.glove_embedding_layer:
+            temp = self.transform_input_ids(texts)
+            print(temp.shape)
+            return temp
+
+        if isinstance(texts, EncodedTexts):
+            # look every distinct word up only once, row 0 (PAD) stays zero
+            word_embeddings = np.zeros(shape=(len(texts.words), GLOVE_EMBEDDING_SIZE))
+            for wid in range(1, len(texts.words)):
+                emb = self.unknown_emb
+                if texts.words[wid] in self.word2em:
+                    emb = self.word2em[texts.words[wid]]
+                word_embeddings[wid, :] = emb
+            temp = word_embeddings[texts.to_padded(self.max_input_seq_length, padding='post')]
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = np.zeros(shape=(self.max_input_seq_length, GLOVE_EMBEDDING_SIZE))
@@ -270,45 +477,41 @@ class Seq2SeqGloVeSummarizer(object):
                     emb = self.word2em[word]
                 x[idx, :] = emb
             temp.append(x)
-        temp = pad_sequences(temp, maxlen=self.max_input_seq_length)
+        temp = np.array(temp)
 
         print(temp.shape)
         return temp
 
     def transform_target_encoding(self, texts):
-        temp = []
-        for line in texts:
-            x = []
+        if isinstance(texts, EncodedTexts):
+            temp = PaddedTexts(texts, self.max_target_seq_length, padding='post', num_tokens=self.num_target_tokens)
+            print(temp.shape)
+            return temp
+
+        temp = np.zeros(shape=(len(texts), self.max_target_seq_length), dtype=np.int32)
+        for lineIdx, line in enumerate(texts):
             line2 = 'START ' + line.lower() + ' END'
-            for word in line2.split(' '):
-                x.append(word)
-                if len(x) >= self.max_target_seq_length:
+            for idx, word in enumerate(line2.split(' ')):
+                if idx >= self.max_target_seq_length:
                     break
-            temp.append(x)
+                if word in self.target_word2idx:
+                    temp[lineIdx, idx] = self.target_word2idx[word]  # default [UNK] is 0
 
-        temp = np.array(temp)
         print(temp.shape)
         return temp
 
-    def generate_batch(self, x_samples, y_samples, batch_size):
-        num_batches = len(x_samples) // batch_size
+    def create_batch_sequence(self, x_samples, y_samples, batch_size, bucket_boundaries=None, num_buffers=None):
+        return Seq2SeqBatchSequence(x_samples, y_samples, batch_size, self.num_target_tokens,
+                                    bucket_boundaries=bucket_boundaries, input_padding='post',
+                                    dtype=self.batch_dtype, num_buffers=num_buffers)
+
+    def generate_batch(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size,
+                                                    bucket_boundaries=bucket_boundaries)
         while True:
-            for batchIdx in range(0, num_batches):
-                start = batchIdx * batch_size
-                end = (batchIdx + 1) * batch_size
-                encoder_input_data_batch = pad_sequences(x_samples[start:end], self.max_input_seq_length)
-                decoder_target_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                decoder_input_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                for lineIdx, target_words in enumerate(y_samples[start:end]):
-                    for idx, w in enumerate(target_words):
-                        w2idx = 0  # default [UNK]
-                        if w in self.target_word2idx:
-                            w2idx = self.target_word2idx[w]
-                        if w2idx != 0:
-                            decoder_input_data_batch[lineIdx, idx, w2idx] = 1
-                            if idx > 0:
-                                decoder_target_data_batch[lineIdx, idx - 1, w2idx] = 1
-                yield [encoder_input_data_batch, decoder_input_data_batch], decoder_target_data_batch
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -322,13 +525,17 @@ class Seq2SeqGloVeSummarizer(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + Seq2SeqGloVeSummarizer.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None,
+            bucket_boundaries=None, workers=None, use_multiprocessing=False,
+            prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -345,52 +552,94 @@ class Seq2SeqGloVeSummarizer(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
-
-        train_num_batches = len(Xtrain) // batch_size
-        test_num_batches = len(Xtest) // batch_size
+        num_buffers = num_prefetch_buffers(prefetch)
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size, bucket_boundaries=bucket_boundaries,
+                                               num_buffers=num_buffers)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size, bucket_boundaries=bucket_boundaries,
+                                              num_buffers=num_buffers)
 
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
-    def summarize(self, input_text):
-        input_seq = np.zeros(shape=(1, self.max_input_seq_length, GLOVE_EMBEDDING_SIZE))
-        for idx, word in enumerate(input_text.lower().split(' ')):
-            if idx >= self.max_input_seq_length:
-                break
-            emb = self.unknown_emb  # default [UNK]
-            if word in self.word2em:
-                emb = self.word2em[word]
-            input_seq[0, idx, :] = emb
+    def summarize(self, input_text, beam_width=None, in_graph=False):
+        if beam_width is not None or in_graph:
+            return self.summarize_batch([input_text], beam_width=beam_width, in_graph=in_graph)[0]
+        input_seq = self.encode_input_text([input_text])
         states_value = self.encoder_model.predict(input_seq)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        # the decoder input of a step and the generated ids go into buffers allocated once per summary
         target_seq = np.zeros((1, 1, self.num_target_tokens))
-        target_seq[0, 0, self.target_word2idx['START']] = 1
-        target_text = ''
-        target_text_len = 0
-        terminated = False
-        while not terminated:
+        target_seq[0, 0, start_token_idx] = 1
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        prev_token_idx = start_token_idx
+        for step in range(self.max_target_seq_length):
             output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value)
 
             sample_token_idx = np.argmax(output_tokens[0, -1, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            target_text_len += 1
-
-            if sample_word != 'START' and sample_word != 'END':
-                target_text += ' ' + sample_word
-
-            if sample_word == 'END' or target_text_len >= self.max_target_seq_length:
-                terminated = True
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
 
-            target_seq = np.zeros((1, 1, self.num_target_tokens))
+            target_seq[0, 0, prev_token_idx] = 0
             target_seq[0, 0, sample_token_idx] = 1
+            prev_token_idx = sample_token_idx
 
             states_value = [h, c]
-        return target_text.strip()
+        return ' '.join([self.target_idx2word[wid] for wid in wids[:num_wids].tolist() if wid != start_token_idx])
+
+    def decode_step(self, token_ids, states_value):
+        target_seq = np.zeros((len(token_ids), 1, self.num_target_tokens))
+        target_seq[np.arange(len(token_ids)), 0, token_ids] = 1
+        output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value, batch_size=len(token_ids))
+        return output_tokens[:, -1, :], [h, c]
+
+    def get_graph_decoder(self):
+        if self.graph_decoder is None:
+            def embed_inputs(token_ids):
+                return K.one_hot(token_ids, self.num_target_tokens)
+
+            token_ids = build_greedy_decode_graph(self.encoder_model.outputs, self.decoder_lstm, self.decoder_dense,
+                                                  embed_inputs, self.target_word2idx['START'],
+                                                  self.target_word2idx['END'], self.max_target_seq_length)
+            self.graph_decoder = K.function(self.encoder_model.inputs, [token_ids])
+        return self.graph_decoder
+
+    def decode_batch(self, input_seq, beam_width=None, in_graph=False):
+        if in_graph and beam_width is not None:
+            raise ValueError('in_graph=True decodes greedily and cannot be combined with beam_width')
+        if beam_width is not None and beam_width < 1:
+            raise ValueError('beam_width must be at least 1, got %s' % beam_width)
+        start_token_idx = self.target_word2idx['START']
+        end_token_idx = self.target_word2idx['END']
+        if in_graph:
+            return trim_at_end_token(self.get_graph_decoder()([input_seq])[0], end_token_idx)
+        states_value = self.encoder_model.predict(input_seq, batch_size=len(input_seq))
+        if beam_width is None:
+            return greedy_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                 self.max_target_seq_length, stats=self.decode_stats)
+        return beam_search_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                  self.max_target_seq_length, beam_width, stats=self.decode_stats)
+
+    def summarize_batch(self, texts, batch_size=None, beam_width=None, in_graph=False):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = [None] * len(texts)
+        # texts of similar length are batched together so that little padding is needed
+        input_lengths = [len(text.split(' ', self.max_input_seq_length)) for text in texts]
+        for batch in length_sorted_batches(input_lengths, batch_size):
+            input_seq = self.encode_input_text([texts[lineIdx] for lineIdx in batch])
+            predicted_wids = self.decode_batch(input_seq, beam_width, in_graph)
+            for lineIdx, wids in zip(batch, predicted_wids):
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts[lineIdx] = ' '.join([word for word in words if word != 'START']).strip()
+        return target_texts
 
 
 class Seq2SeqGloVeSummarizerV2(object):
@@ -407,7 +656,16 @@ class Seq2SeqGloVeSummarizerV2(object):
         if 'version' in config:
             self.version = config['version']
 
+        # dtype of the one-hot vectors of the training batches, e.g. 'uint8' to save memory
+        self.batch_dtype = DEFAULT_BATCH_DTYPE
+        if 'batch_dtype' in config:
+            self.batch_dtype = config['batch_dtype']
+
+        self.decode_stats = create_decode_stats()
+        self.prefetch_stats = create_prefetch_stats()
+
         self.word2em = dict()
+        self.target_embeddings = None
         if 'unknown_emb' in config:
             self.unknown_emb = config['unknown_emb']
         else:
@@ -417,8 +675,9 @@ class Seq2SeqGloVeSummarizerV2(object):
         self.config = config
 
         encoder_inputs = Input(shape=(None, GLOVE_EMBEDDING_SIZE), name='encoder_inputs')
+        encoder_masking = Masking(name='encoder_masking')
         encoder_lstm = LSTM(units=HIDDEN_UNITS, return_state=True, name='encoder_lstm')
-        encoder_outputs, encoder_state_h, encoder_state_c = encoder_lstm(encoder_inputs)
+        encoder_outputs, encoder_state_h, encoder_state_c = encoder_lstm(encoder_masking(encoder_inputs))
         encoder_states = [encoder_state_h, encoder_state_c]
 
         decoder_inputs = Input(shape=(None, GLOVE_EMBEDDING_SIZE), name='decoder_inputs')
@@ -442,14 +701,61 @@ class Seq2SeqGloVeSummarizerV2(object):
         decoder_outputs = decoder_dense(decoder_outputs)
         self.decoder_model = Model([decoder_inputs] + decoder_state_inputs, [decoder_outputs] + decoder_states)
 
+        self.decoder_lstm = decoder_lstm
+        self.decoder_dense = decoder_dense
+        self.graph_decoder = None
+
     def load_weights(self, weight_file_path):
         if os.path.exists(weight_file_path):
             self.model.load_weights(weight_file_path)
 
-    def load_glove(self, data_dir_path):
-        self.word2em = load_glove(data_dir_path)
+    def load_glove(self, data_dir_path, vocab=None):
+        self.word2em = load_glove(data_dir_path, vocab=vocab)
+        self.target_embeddings = self.get_target_embedding_matrix()
+        # the graph decoder holds the target embeddings as a constant, so it is built again with the new ones
+        self.graph_decoder = None
+
+    def get_target_embedding_matrix(self):
+        # rows are aligned with target_idx2word; two extra rows follow for the 'start' word, which need not be in the
+        # target vocabulary, and for padding
+        target_embeddings = np.zeros(shape=(self.num_target_tokens + 2, GLOVE_EMBEDDING_SIZE), dtype=np.float32)
+        for idx, word in self.target_idx2word.items():
+            emb = self.unknown_emb
+            if word in self.word2em:
+                emb = self.word2em[word]
+            target_embeddings[idx, :] = emb
+        if 'start' in self.word2em:
+            target_embeddings[self.num_target_tokens, :] = self.word2em['start']
+        else:
+            target_embeddings[self.num_target_tokens, :] = self.unknown_emb
+        return target_embeddings
+
+    def encode_input_text(self, texts):
+        # padded only up to the longest text of the batch, the padding is masked out in the encoder
+        input_seq_length = max([len(text.split(' ', self.max_input_seq_length)) for text in texts] + [1])
+        input_seq_length = min(input_seq_length, self.max_input_seq_length)
+        input_seq = np.zeros(shape=(len(texts), input_seq_length, GLOVE_EMBEDDING_SIZE))
+        for lineIdx, input_text in enumerate(texts):
+            for idx, word in enumerate(input_text.lower().split(' ', input_seq_length)[:input_seq_length]):
+                emb = self.unknown_emb  # default [UNK]
+                if word in self.word2em:
+                    emb = self.word2em[word]
+                input_seq[lineIdx, idx, :] = emb
+        return input_seq
 
     def transform_input_text(self, texts):
+        if isinstance(texts, EncodedTexts):
+            # look every distinct word up only once, row 0 (PAD) stays zero
+            word_embeddings = np.zeros(shape=(len(texts.words), GLOVE_EMBEDDING_SIZE))
+            for wid in range(1, len(texts.words)):
+                emb = self.unknown_emb
+                if texts.words[wid] in self.word2em:
+                    emb = self.word2em[texts.words[wid]]
+                word_embeddings[wid, :] = emb
+            temp = word_embeddings[texts.to_padded(self.max_input_seq_length, padding='post')]
+            print(temp.shape)
+            return temp
+
         temp = []
         for line in texts:
             x = np.zeros(shape=(self.max_input_seq_length, GLOVE_EMBEDDING_SIZE))
@@ -461,47 +767,55 @@ class Seq2SeqGloVeSummarizerV2(object):
                     emb = self.word2em[word]
                 x[idx, :] = emb
             temp.append(x)
-        temp = pad_sequences(temp, maxlen=self.max_input_seq_length)
+        temp = np.array(temp)
 
         print(temp.shape)
         return temp
 
     def transform_target_encoding(self, texts):
-        temp = []
-        for line in texts:
-            x = []
+        # token ids follow the rows of target_embeddings: num_target_tokens is 'start', num_target_tokens + 1 padding
+        if isinstance(texts, EncodedTexts):
+            # the START / END markers of the encoded texts become 'start' / 'end' like below
+            wid2idx = np.array([self.target_word2idx.get(word.lower(), 0) for word in texts.words], dtype=np.int32)
+            positions = np.arange(self.max_target_seq_length)[np.newaxis, :]
+            filled = positions < np.minimum(texts.lengths, self.max_target_seq_length)[:, np.newaxis]
+            temp = np.where(filled, wid2idx[texts.to_padded(self.max_target_seq_length, padding='post')],
+                            self.num_target_tokens + 1).astype(np.int32)
+            temp[:, 0] = self.num_target_tokens
+            print(temp.shape)
+            return temp
+
+        temp = np.full(shape=(len(texts), self.max_target_seq_length), fill_value=self.num_target_tokens + 1,
+                       dtype=np.int32)
+        for lineIdx, line in enumerate(texts):
             line2 = 'start ' + line.lower() + ' end'
-            for word in line2.split(' '):
-                x.append(word)
-                if len(x) >= self.max_target_seq_length:
+            for idx, word in enumerate(line2.split(' ')):
+                if idx >= self.max_target_seq_length:
                     break
-            temp.append(x)
+                w2idx = 0  # default [UNK]
+                if idx == 0:
+                    w2idx = self.num_target_tokens
+                elif word in self.target_word2idx:
+                    w2idx = self.target_word2idx[word]
+                temp[lineIdx, idx] = w2idx
 
-        temp = np.array(temp)
         print(temp.shape)
         return temp
 
-    def generate_batch(self, x_samples, y_samples, batch_size):
-        num_batches = len(x_samples) // batch_size
+    def create_batch_sequence(self, x_samples, y_samples, batch_size, bucket_boundaries=None, num_buffers=None):
+        return Seq2SeqBatchSequence(x_samples, y_samples, batch_size, self.num_target_tokens,
+                                    bucket_boundaries=bucket_boundaries, input_padding='post',
+                                    target_padding_value=self.num_target_tokens + 1,
+                                    target_embeddings=self.target_embeddings,
+                                    dtype=self.batch_dtype, num_buffers=num_buffers)
+
+    def generate_batch(self, x_samples, y_samples, batch_size, bucket_boundaries=None):
+        batch_sequence = self.create_batch_sequence(x_samples, y_samples, batch_size,
+                                                    bucket_boundaries=bucket_boundaries)
         while True:
-            for batchIdx in range(0, num_batches):
-                start = batchIdx * batch_size
-                end = (batchIdx + 1) * batch_size
-                encoder_input_data_batch = pad_sequences(x_samples[start:end], self.max_input_seq_length)
-                decoder_target_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, self.num_target_tokens))
-                decoder_input_data_batch = np.zeros(shape=(batch_size, self.max_target_seq_length, GLOVE_EMBEDDING_SIZE))
-                for lineIdx, target_words in enumerate(y_samples[start:end]):
-                    for idx, w in enumerate(target_words):
-                        w2idx = 0  # default [UNK]
-                        if w in self.word2em:
-                            emb = self.unknown_emb
-                            decoder_input_data_batch[lineIdx, idx, :] = emb
-                        if w in self.target_word2idx:
-                            w2idx = self.target_word2idx[w]
-                        if w2idx != 0:
-                            if idx > 0:
-                                decoder_target_data_batch[lineIdx, idx - 1, w2idx] = 1
-                yield [encoder_input_data_batch, decoder_input_data_batch], decoder_target_data_batch
+            for batchIdx in range(0, len(batch_sequence)):
+                yield batch_sequence[batchIdx]
+            batch_sequence.on_epoch_end()
 
     @staticmethod
     def get_weight_file_path(model_dir_path):
@@ -515,13 +829,17 @@ class Seq2SeqGloVeSummarizerV2(object):
     def get_architecture_file_path(model_dir_path):
         return model_dir_path + '/' + Seq2SeqGloVeSummarizerV2.model_name + '-architecture.json'
 
-    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None):
+    def fit(self, Xtrain, Ytrain, Xtest, Ytest, epochs=None, batch_size=None, model_dir_path=None,
+            bucket_boundaries=None, workers=None, use_multiprocessing=False,
+            prefetch=None):
         if epochs is None:
             epochs = DEFAULT_EPOCHS
         if model_dir_path is None:
             model_dir_path = './models'
         if batch_size is None:
             batch_size = DEFAULT_BATCH_SIZE
+        if workers is None:
+            workers = DEFAULT_WORKERS
 
         self.version += 1
         self.config['version'] = self.version
@@ -538,54 +856,96 @@ class Seq2SeqGloVeSummarizerV2(object):
         Xtrain = self.transform_input_text(Xtrain)
         Xtest = self.transform_input_text(Xtest)
 
-        train_gen = self.generate_batch(Xtrain, Ytrain, batch_size)
-        test_gen = self.generate_batch(Xtest, Ytest, batch_size)
+        num_buffers = num_prefetch_buffers(prefetch)
+        train_seq = self.create_batch_sequence(Xtrain, Ytrain, batch_size, bucket_boundaries=bucket_boundaries,
+                                               num_buffers=num_buffers)
+        test_seq = self.create_batch_sequence(Xtest, Ytest, batch_size, bucket_boundaries=bucket_boundaries,
+                                              num_buffers=num_buffers)
 
-        train_num_batches = len(Xtrain) // batch_size
-        test_num_batches = len(Xtest) // batch_size
-
-        history = self.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
-                                           epochs=epochs,
-                                           verbose=VERBOSE, validation_data=test_gen, validation_steps=test_num_batches,
-                                           callbacks=[checkpoint])
+        history = fit_sequences(self.model, train_seq, test_seq, epochs, VERBOSE, [checkpoint], workers=workers,
+                                use_multiprocessing=use_multiprocessing, prefetch=prefetch,
+                                stats=self.prefetch_stats)
         self.model.save_weights(weight_file_path)
         return history
 
-    def summarize(self, input_text):
-        input_seq = np.zeros(shape=(1, self.max_input_seq_length, GLOVE_EMBEDDING_SIZE))
-        for idx, word in enumerate(input_text.lower().split(' ')):
-            if idx >= self.max_input_seq_length:
-                break
-            emb = self.unknown_emb  # default [UNK]
-            if word in self.word2em:
-                emb = self.word2em[word]
-            input_seq[0, idx, :] = emb
+    def summarize(self, input_text, beam_width=None, in_graph=False):
+        if beam_width is not None or in_graph:
+            return self.summarize_batch([input_text], beam_width=beam_width, in_graph=in_graph)[0]
+        input_seq = self.encode_input_text([input_text])
         states_value = self.encoder_model.predict(input_seq)
+        end_token_idx = -1
+        if 'end' in self.target_word2idx:
+            end_token_idx = self.target_word2idx['end']
+        # the decoder input of a step and the generated ids go into buffers allocated once per summary
         target_seq = np.zeros((1, 1, GLOVE_EMBEDDING_SIZE))
-        target_seq[0, 0, :] = self.word2em['start']
-        target_text = ''
-        target_text_len = 0
-        terminated = False
-        while not terminated:
+        target_seq[0, 0, :] = self.target_embeddings[self.num_target_tokens]
+        wids = np.zeros(self.max_target_seq_length, dtype=np.int32)
+        num_wids = 0
+        for step in range(self.max_target_seq_length):
             output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value)
 
             sample_token_idx = np.argmax(output_tokens[0, -1, :])
-            sample_word = self.target_idx2word[sample_token_idx]
-            target_text_len += 1
-
-            if sample_word != 'start' and sample_word != 'end':
-                target_text += ' ' + sample_word
+            if sample_token_idx == end_token_idx:
+                break
+            wids[num_wids] = sample_token_idx
+            num_wids += 1
 
-            if sample_word == 'end' or target_text_len >= self.max_target_seq_length:
-                terminated = True
-
-            if sample_word in self.word2em:
-                target_seq[0, 0, :] = self.word2em[sample_word]
-            else:
-                target_seq[0, 0, :] = self.unknown_emb
+            target_seq[0, 0, :] = self.target_embeddings[sample_token_idx]
 
             states_value = [h, c]
-        return target_text.strip()
-
-
-
+        words = [self.target_idx2word[wid] for wid in wids[:num_wids].tolist()]
+        return ' '.join([word for word in words if word != 'start'])
+
+    def decode_step(self, token_ids, states_value):
+        target_seq = self.target_embeddings[token_ids][:, np.newaxis, :]
+        output_tokens, h, c = self.decoder_model.predict([target_seq] + states_value, batch_size=len(token_ids))
+        return output_tokens[:, -1, :], [h, c]
+
+    def get_graph_decoder(self):
+        if self.graph_decoder is None:
+            target_embeddings = K.constant(self.target_embeddings)
+            end_token_idx = -1
+            if 'end' in self.target_word2idx:
+                end_token_idx = self.target_word2idx['end']
+
+            def embed_inputs(token_ids):
+                return K.gather(target_embeddings, token_ids)
+
+            token_ids = build_greedy_decode_graph(self.encoder_model.outputs, self.decoder_lstm, self.decoder_dense,
+                                                  embed_inputs, self.num_target_tokens, end_token_idx,
+                                                  self.max_target_seq_length)
+            self.graph_decoder = K.function(self.encoder_model.inputs, [token_ids])
+        return self.graph_decoder
+
+    def decode_batch(self, input_seq, beam_width=None, in_graph=False):
+        if in_graph and beam_width is not None:
+            raise ValueError('in_graph=True decodes greedily and cannot be combined with beam_width')
+        if beam_width is not None and beam_width < 1:
+            raise ValueError('beam_width must be at least 1, got %s' % beam_width)
+        start_token_idx = self.num_target_tokens
+        end_token_idx = -1
+        if 'end' in self.target_word2idx:
+            end_token_idx = self.target_word2idx['end']
+        if in_graph:
+            return trim_at_end_token(self.get_graph_decoder()([input_seq])[0], end_token_idx)
+        states_value = self.encoder_model.predict(input_seq, batch_size=len(input_seq))
+        if beam_width is None:
+            return greedy_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                 self.max_target_seq_length, stats=self.decode_stats)
+        return beam_search_decode(self.decode_step, states_value, start_token_idx, end_token_idx,
+                                  self.max_target_seq_length, beam_width, stats=self.decode_stats)
+
+    def summarize_batch(self, texts, batch_size=None, beam_width=None, in_graph=False):
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+        texts = list(texts)
+        target_texts = [None] * len(texts)
+        # texts of similar length are batched together so that little padding is needed
+        input_lengths = [len(text.split(' ', self.max_input_seq_length)) for text in texts]
+        for batch in length_sorted_batches(input_lengths, batch_size):
+            input_seq = self.encode_input_text([texts[lineIdx] for lineIdx in batch])
+            predicted_wids = self.decode_batch(input_seq, beam_width, in_graph)
+            for lineIdx, wids in zip(batch, predicted_wids):
+                words = [self.target_idx2word[wid] for wid in wids]
+                target_texts[lineIdx] = ' '.join([word for word in words if word != 'start']).strip()
+        return target_texts
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def sequence_lengths(samples, padding='pre', value=0):
+    """
+    Length of every row of a padded (num_samples, max_seq_length) id matrix or (num_samples, max_seq_length, dim)
+    embedding tensor, where padding ('pre' or 'post') tells on which side the rows were padded with value.
+    """
+    samples = np.asarray(samples)
+    filled = samples != value
+    if filled.ndim == 3:
+        filled = filled.any(axis=2)
+    max_seq_length = filled.shape[1]
+    if padding == 'pre':
+        lengths = max_seq_length - np.argmax(filled, axis=1)
+    else:
+        lengths = max_seq_length - np.argmax(filled[:, ::-1], axis=1)
+    lengths[~filled.any(axis=1)] = 0
+    return lengths
+
+
+def bucket_order(lengths, bucket_boundaries, shuffle=True):
+    """
+    Orders the sample indices so that samples of the same length bucket are next to each other. A sample goes into
+    the first bucket whose boundary is >= its length, the samples longer than the last boundary form one more bucket.
+    With shuffle, the samples are shuffled within their bucket and the buckets are visited in random order.
+    """
+    bucket_ids = np.searchsorted(np.sort(bucket_boundaries), lengths, side='left')
+    buckets = np.unique(bucket_ids)
+    if shuffle:
+        np.random.shuffle(buckets)
+    order = []
+    for bucket in buckets:
+        indices = np.flatnonzero(bucket_ids == bucket)
+        if shuffle:
+            np.random.shuffle(indices)
+        order.append(indices)
+    return np.concatenate(order)
+
+
+def bucket_batches(lengths, batch_size, bucket_boundaries, shuffle=True):
+    """
+    Splits the samples into len(lengths) // batch_size batches of sample indices, each batch drawn from one length
+    bucket where possible, so that it only needs padding up to its own longest sample.
+    """
+    order = bucket_order(lengths, bucket_boundaries, shuffle=shuffle)
+    num_batches = len(order) // batch_size
+    batches = [order[batchIdx * batch_size:(batchIdx + 1) * batch_size] for batchIdx in range(num_batches)]
+    if shuffle:
+        batches = [batches[batchIdx] for batchIdx in np.random.permutation(num_batches)]
+    return batches
+
+
+def length_sorted_batches(lengths, batch_size):
+    """
+    Splits all the sample indices into batches of at most batch_size samples of similar length, for inference where
+    every sample must be seen exactly once and each batch is padded up to its own longest sample.
+    """
+    order = np.argsort(lengths, kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
@@ -0,0 +1,194 @@
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+# bump when the encoding or the files written by save_encoded_texts() change, so that old caches are not reused
+ENCODED_TEXTS_FORMAT_VERSION = 1
+
+
+class EncodedTexts(object):
+    """
+    Token ids of a whole corpus, as produced by encode_corpus(): row i of ids holds the lengths[i] token ids of text i,
+    left-aligned and filled up with zeros. words[wid] is the word of token id wid.
+
+    The ids are ranked by word frequency after the reserved words, so a model whose vocabulary keeps the
+    num_tokens most frequent ids treats every id >= num_tokens as unknown.
+
+    Indexing with an index array or slice selects texts, so an EncodedTexts can be split by index arrays. When ids
+    is the ShardedArray of a token dataset, the selection only records the rows, which are read when padded.
+    """
+
+    def __init__(self, ids, lengths, words):
+        self.ids = ids
+        self.lengths = lengths
+        self.words = words
+
+    @property
+    def shape(self):
+        return self.ids.shape
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if hasattr(self.ids, 'select_rows'):
+            return EncodedTexts(self.ids.select_rows(index), self.lengths[index], self.words)
+        return EncodedTexts(self.ids[index], self.lengths[index], self.words)
+
+    def to_padded(self, maxlen, padding='pre', num_tokens=None, unknown_id=0, value=0):
+        """
+        Returns a (num_texts, maxlen) int32 matrix of the first maxlen token ids of every text, padded with value
+        before ('pre') or after ('post') the ids, where ids >= num_tokens are replaced by unknown_id.
+        """
+        lengths = np.minimum(self.lengths, maxlen)
+        ids = self.ids[:, :maxlen]
+        if ids.shape[1] < maxlen:
+            ids = np.pad(ids, [(0, 0), (0, maxlen - ids.shape[1])], mode='constant')
+        if num_tokens is not None:
+            ids = np.where(ids < num_tokens, ids, unknown_id)
+        positions = np.arange(maxlen)[np.newaxis, :]
+        if padding == 'pre':
+            # move every row to the right so that its last id lands in the last column
+            positions = positions - (maxlen - lengths)[:, np.newaxis]
+            ids = np.take_along_axis(ids, np.maximum(positions, 0), axis=1)
+            filled = positions >= 0
+        else:
+            filled = positions < lengths[:, np.newaxis]
+        return np.where(filled, ids, value).astype(np.int32)
+
+    def to_word_lists(self):
+        return [[self.words[wid] for wid in wids[:length]] for wids, length in zip(self.ids, self.lengths)]
+
+
+class PaddedTexts(object):
+    """
+    The matrix encoded_texts.to_padded(maxlen, ...) as a view that pads only the texts it is indexed with, so that
+    the batches of a memory-mapped token dataset read only their own rows. Indexing takes a row index, slice or index
+    array, optionally followed by a column index, like the matrix itself.
+    """
+
+    def __init__(self, encoded_texts, maxlen, padding='pre', num_tokens=None, unknown_id=0, value=0):
+        self.encoded_texts = encoded_texts
+        self.maxlen = maxlen
+        self.padding = padding
+        self.num_tokens = num_tokens
+        self.unknown_id = unknown_id
+        self.value = value
+        self.shape = (len(encoded_texts), maxlen)
+        self.dtype = np.dtype(np.int32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        columns = slice(None)
+        if isinstance(index, tuple):
+            index, columns = index
+        if isinstance(index, (int, np.integer)):
+            return self[[index]][0, columns]
+        return self.encoded_texts[index].to_padded(self.maxlen, padding=self.padding, num_tokens=self.num_tokens,
+                                                   unknown_id=self.unknown_id, value=self.value)[:, columns]
+
+    def padded_lengths(self):
+        """
+        Number of ids of every padded row, read from the length index without padding any row.
+        """
+        return np.minimum(self.encoded_texts.lengths, self.maxlen)
+
+
+def encode_corpus(texts, max_seq_length, reserved_words=None, start_word=None, end_word=None):
+    """
+    Tokenizes every text once (lower case, split on spaces, optionally wrapped in start_word / end_word, cut at
+    max_seq_length words). Words get provisional ids in order of first occurrence during the pass, which are then
+    remapped to their frequency rank (ties keep the order of first occurrence, like Counter.most_common), placed
+    after the reserved_words.
+
+    Returns the EncodedTexts and the number of occurrences of every word in its words list.
+    """
+    if reserved_words is None:
+        reserved_words = []
+    word2pid = dict()
+    rows = []
+    for line in texts:
+        words = line.lower().split(' ')
+        if start_word is not None:
+            words = [start_word] + words
+        if end_word is not None:
+            words = words + [end_word]
+        words = words[:max_seq_length]
+        rows.append([word2pid.setdefault(word, len(word2pid)) for word in words])
+
+    lengths = np.array([len(row) for row in rows], dtype=np.int32)
+    provisional_ids = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int32, count=int(lengths.sum()))
+    counts = np.bincount(provisional_ids, minlength=len(word2pid))
+
+    ranked_pids = np.argsort(-counts, kind='stable')
+    pid2wid = np.empty(len(word2pid), dtype=np.int32)
+    pid2wid[ranked_pids] = np.arange(len(word2pid), dtype=np.int32) + len(reserved_words)
+    pid2word = [None] * len(word2pid)
+    for word, pid in word2pid.items():
+        pid2word[pid] = word
+    words = list(reserved_words) + [pid2word[pid] for pid in ranked_pids]
+    word_counts = np.concatenate([np.zeros(len(reserved_words), dtype=counts.dtype), counts[ranked_pids]])
+
+    ids = np.zeros(shape=(len(rows), lengths.max(initial=1)), dtype=np.int32)
+    ids[np.arange(ids.shape[1])[np.newaxis, :] < lengths[:, np.newaxis]] = pid2wid[provisional_ids]
+    return EncodedTexts(ids, lengths, words), word_counts
+
+
+def encode_texts(texts, words, max_seq_length, unknown_id, start_word=None, end_word=None):
+    """
+    Tokenizes texts like encode_corpus(), but against the fixed vocabulary words (e.g. the words of an EncodedTexts
+    or of a config), so that chunks of a corpus encoded one by one share their token ids. Words that are not in
+    words get unknown_id.
+    """
+    word2idx = dict([(word, idx) for idx, word in enumerate(words)])
+    rows = []
+    for line in texts:
+        line_words = line.lower().split(' ')
+        if start_word is not None:
+            line_words = [start_word] + line_words
+        if end_word is not None:
+            line_words = line_words + [end_word]
+        rows.append([word2idx.get(word, unknown_id) for word in line_words[:max_seq_length]])
+
+    lengths = np.array([len(row) for row in rows], dtype=np.int32)
+    ids = np.zeros(shape=(len(rows), lengths.max(initial=1)), dtype=np.int32)
+    ids[np.arange(ids.shape[1])[np.newaxis, :] < lengths[:, np.newaxis]] = np.fromiter(
+        itertools.chain.from_iterable(rows), dtype=np.int32, count=int(lengths.sum()))
+    return EncodedTexts(ids, lengths, list(words))
+
+
+def get_corpus_hash(text_collections, settings):
+    """
+    Content hash (hex sha1) of the texts of every collection and of the settings they are encoded with.
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((ENCODED_TEXTS_FORMAT_VERSION, settings)).encode('utf-8'))
+    for texts in text_collections:
+        digest.update(b'\x01')
+        for line in texts:
+            digest.update(line.encode('utf-8'))
+            digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def save_encoded_texts(encoded_texts, dir_path, name):
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    np.save(os.path.join(dir_path, name + '-ids.npy'), encoded_texts.ids)
+    np.save(os.path.join(dir_path, name + '-lengths.npy'), encoded_texts.lengths)
+    # words may contain any character except ' ', so they are not stored one per line
+    with open(os.path.join(dir_path, name + '-words.json'), 'w') as file:
+        json.dump(encoded_texts.words, file)
+
+
+def load_encoded_texts(dir_path, name, mmap_mode='r'):
+    ids = np.load(os.path.join(dir_path, name + '-ids.npy'), mmap_mode=mmap_mode)
+    lengths = np.load(os.path.join(dir_path, name + '-lengths.npy'), mmap_mode=mmap_mode)
+    with open(os.path.join(dir_path, name + '-words.json')) as file:
+        words = json.load(file)
+    return EncodedTexts(ids, lengths, words)
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+from operator import itemgetter
+
+
+class SpaceSavingCounter(object):
+    """
+    Approximate word counter (the Space-Saving algorithm) that never monitors more than capacity words.
+
+    When a new word arrives and the counter is full, the word with the smallest count is evicted and the new word
+    takes over its count + 1, recording that count as its possible overestimation (errors[word]). The true count of a
+    monitored word is therefore between counts[word] - errors[word] and counts[word], and an evicted word was seen
+    at most min_count() times. While nothing has been evicted the counts are exact and most_common() returns the
+    same list as collections.Counter, ties included.
+
+    The word with the smallest count is found through a lazy min-heap: counts only grow, so heap entries are not
+    updated on increments but re-pushed with their current count when they come up stale.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = dict()
+        self.errors = dict()
+        self.heap = []
+        self.num_counted = 0
+        self.exact = True
+
+    def __len__(self):
+        return len(self.counts)
+
+    def update(self, words):
+        if isinstance(words, SpaceSavingCounter):
+            self.merge(words)
+            return
+        counts = self.counts
+        for word in words:
+            self.num_counted += 1
+            if word in counts:
+                counts[word] += 1
+            elif len(counts) < self.capacity:
+                counts[word] = 1
+                self.errors[word] = 0
+                heapq.heappush(self.heap, (1, word))
+            else:
+                min_count, min_word = self.pop_min()
+                del counts[min_word]
+                del self.errors[min_word]
+                counts[word] = min_count + 1
+                self.errors[word] = min_count
+                heapq.heappush(self.heap, (min_count + 1, word))
+                self.exact = False
+
+    def pop_min(self):
+        while True:
+            count, word = heapq.heappop(self.heap)
+            if self.counts[word] == count:
+                return count, word
+            heapq.heappush(self.heap, (self.counts[word], word))
+
+    def min_count(self):
+        # while nothing has been evicted, a word that is not monitored was never seen, even if the counter is full
+        if self.exact or len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def merge(self, other):
+        """
+        Adds the words counted by other, as in the mergeable Space-Saving summaries: a word missing from one of the
+        counters is taken to have that counter's min_count(). Words of self come first, so merging shard counters in
+        shard order keeps the order in which the words first occur.
+        """
+        own_min_count = self.min_count()
+        other_min_count = other.min_count()
+        counts = dict()
+        errors = dict()
+        for word in itertools.chain(self.counts, other.counts):
+            if word in counts:
+                continue
+            counts[word] = self.counts.get(word, own_min_count) + other.counts.get(word, other_min_count)
+            errors[word] = self.errors.get(word, own_min_count) + other.errors.get(word, other_min_count)
+        if len(counts) > self.capacity:
+            kept = set(heapq.nlargest(self.capacity, counts, key=counts.get))
+            counts = dict([(word, count) for word, count in counts.items() if word in kept])
+            errors = dict([(word, error) for word, error in errors.items() if word in kept])
+            self.exact = False
+        self.exact = self.exact and other.exact
+        self.counts = counts
+        self.errors = errors
+        self.heap = [(count, word) for word, count in counts.items()]
+        heapq.heapify(self.heap)
+        self.num_counted += other.num_counted
+
+    def most_common(self, n=None):
+        if n is None:
+            return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def error_report(self, n):
+        """
+        How far the top n of this counter can be from the exact top n:
+
+        * max_error / mean_error: largest and mean possible overestimation of the counts of the top n words
+        * num_guaranteed: top n words whose lowest possible count still reaches the highest possible count of every
+          word outside the top n, i.e. that are in the exact top n (up to ties)
+        """
+        top = self.most_common(n)
+        # any word outside the top n, monitored or evicted, was seen at most this often
+        outside_count = self.min_count()
+        if len(self.counts) > n:
+            outside_count = max(outside_count, self.most_common(n + 1)[-1][1])
+        top_errors = [self.errors[word] for word, _ in top]
+
+        report = dict()
+        report['capacity'] = self.capacity
+        report['num_counted'] = self.num_counted
+        report['exact'] = self.exact
+        report['max_error'] = max(top_errors + [0])
+        report['mean_error'] = float(sum(top_errors)) / max(len(top_errors), 1)
+        report['num_guaranteed'] = sum([1 for word, count in top if count - self.errors[word] >= outside_count])
+        return report
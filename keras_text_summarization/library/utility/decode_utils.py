@@ -0,0 +1,254 @@
+import numpy as np
+import tensorflow as tf
+
+
+def create_decode_stats():
+    """
+    Counters filled by the batched decoders:
+
+    * decoder_steps: number of batched decoder calls
+    * decoded_rows: number of rows pushed through the decoder, summed over all calls
+    * rows_saved: rows that were dropped from the live batch after emitting the end token, summed over all calls
+    * steps_saved: decoder calls skipped because every row of a batch finished before max_target_seq_length
+    """
+    return {'decoder_steps': 0, 'decoded_rows': 0, 'rows_saved': 0, 'steps_saved': 0}
+
+
+def greedy_decode(decode_step, states_value, start_token_idx, end_token_idx, max_target_seq_length, stats=None):
+    """
+    Greedy (argmax) decoding of a whole batch of encoded articles at once.
+
+    decode_step(token_ids, states_value) runs one decoder step for every row of the batch and must return the
+    probabilities over the target vocabulary, shape (batch_size, num_target_tokens), together with the new states.
+    Rows that emit the end token are removed from the live batch, so later steps only run the unfinished rows.
+
+    Returns one list of generated token ids per row, without the terminating end token.
+    """
+    num_rows = states_value[0].shape[0]
+    token_ids = np.full(num_rows, start_token_idx, dtype=np.int32)
+    active_rows = np.arange(num_rows)
+    results = [[] for _ in range(num_rows)]
+
+    for step in range(max_target_seq_length):
+        output_tokens, states_value = decode_step(token_ids, states_value)
+        token_ids = np.argmax(output_tokens, axis=-1).astype(np.int32)
+
+        if stats is not None:
+            stats['decoder_steps'] += 1
+            stats['decoded_rows'] += len(active_rows)
+            stats['rows_saved'] += num_rows - len(active_rows)
+
+        running = token_ids != end_token_idx
+        for row, token_idx in zip(active_rows[running], token_ids[running]):
+            results[row].append(int(token_idx))
+
+        if not running.all():
+            active_rows = active_rows[running]
+            if len(active_rows) == 0:
+                if stats is not None:
+                    stats['steps_saved'] += max_target_seq_length - step - 1
+                break
+            token_ids = token_ids[running]
+            states_value = [state[running] for state in states_value]
+
+    return results
+
+
+def prefix_greedy_decode(predict_step, encoder_value, start_token_idx, end_token_idx, max_target_seq_length,
+                         decoder_seq_length, stats=None):
+    """
+    Greedy (argmax) decoding of a whole batch for the recursive rnn models, which read the summary generated so far
+    as a prefix of token ids padded in front, like pad_sequences(). The prefixes are kept in one
+    (batch_size, decoder_seq_length) int32 matrix that is shifted left by one column in place after every step, so
+    a prefix longer than decoder_seq_length keeps its last words.
+
+    predict_step(encoder_value, prefixes) must return the probabilities over the target vocabulary of the next token
+    of every row, shape (batch_size, num_target_tokens). encoder_value holds the per-row encoder input, e.g. the
+    article ids or cached article vectors. Rows that emit the end token are moved out of the top rows of encoder_value
+    and the prefixes, so later steps only run the unfinished rows.
+
+    As in summarize(), the start token and the generated tokens together are at most max_target_seq_length long.
+    Returns one list of generated token ids per row, without the terminating end token.
+    """
+    encoder_value = np.array(encoder_value)
+    num_rows = len(encoder_value)
+    prefixes = np.zeros(shape=(num_rows, decoder_seq_length), dtype=np.int32)
+    prefixes[:, -1] = start_token_idx
+    active_rows = np.arange(num_rows)
+    results = [[] for _ in range(num_rows)]
+
+    num_steps = max(max_target_seq_length - 1, 1)
+    for step in range(num_steps):
+        num_active = len(active_rows)
+        output_tokens = predict_step(encoder_value[:num_active], prefixes[:num_active])
+        token_ids = np.argmax(output_tokens, axis=-1).astype(np.int32)
+
+        if stats is not None:
+            stats['decoder_steps'] += 1
+            stats['decoded_rows'] += num_active
+            stats['rows_saved'] += num_rows - num_active
+
+        running = token_ids != end_token_idx
+        for row, token_idx in zip(active_rows[running], token_ids[running]):
+            results[row].append(int(token_idx))
+
+        prefixes[:num_active, :-1] = prefixes[:num_active, 1:]
+        prefixes[:num_active, -1] = token_ids
+
+        if not running.all():
+            active_rows = active_rows[running]
+            if len(active_rows) == 0:
+                if stats is not None:
+                    stats['steps_saved'] += num_steps - step - 1
+                break
+            prefixes[:len(active_rows)] = prefixes[:num_active][running]
+            encoder_value[:len(active_rows)] = encoder_value[:num_active][running]
+
+    return results
+
+
+def beam_search_decode(decode_step, states_value, start_token_idx, end_token_idx, max_target_seq_length, beam_width,
+                       stats=None):
+    """
+    Beam search decoding of a whole batch of encoded articles at once.
+
+    The beam_width hypotheses of every article are stacked into a single batch of
+    (num_articles * beam_width) rows, so each step is one decode_step call, and the top-k selection over the summed
+    log-probabilities is done with NumPy for all articles together. Articles are removed from the live batch once
+    none of their open hypotheses can beat their best finished one. With beam_width=1 this is the greedy decode.
+
+    Returns the best list of generated token ids per article, without the terminating end token.
+    """
+    num_rows = states_value[0].shape[0]
+    k = beam_width
+
+    # every article starts with a single open hypothesis, the other beam slots are disabled with a -inf score
+    scores = np.full((num_rows, k), -np.inf)
+    scores[:, 0] = 0.0
+    token_ids = np.full(num_rows * k, start_token_idx, dtype=np.int32)
+    histories = np.zeros((num_rows, k, max_target_seq_length), dtype=np.int32)
+    states_value = [np.repeat(state, k, axis=0) for state in states_value]
+    active_rows = np.arange(num_rows)
+
+    best_scores = np.full(num_rows, -np.inf)
+    results = [[] for _ in range(num_rows)]
+
+    for step in range(max_target_seq_length):
+        num_active = len(active_rows)
+        output_tokens, states_value = decode_step(token_ids, states_value)
+        num_target_tokens = output_tokens.shape[-1]
+
+        if stats is not None:
+            stats['decoder_steps'] += 1
+            stats['decoded_rows'] += num_active * k
+            stats['rows_saved'] += (num_rows - num_active) * k
+
+        log_probs = np.log(np.maximum(output_tokens, 1e-30)).reshape(num_active, k, num_target_tokens)
+        candidates = (scores[:, :, np.newaxis] + log_probs).reshape(num_active, k * num_target_tokens)
+
+        # the best 2k candidates always hold k hypotheses that do not end here
+        num_candidates = min(2 * k, k * num_target_tokens)
+        top = np.argpartition(-candidates, num_candidates - 1, axis=1)[:, :num_candidates]
+        top_scores = np.take_along_axis(candidates, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        top_beams = top // num_target_tokens
+        top_tokens = top % num_target_tokens
+        ended = top_tokens == end_token_idx
+
+        # hypotheses ranked within the top k that emit the end token are finished
+        ended_in_beam = ended[:, :k] & (top_scores[:, :k] > best_scores[active_rows, np.newaxis])
+        for i, j in zip(*np.nonzero(ended_in_beam)):
+            if top_scores[i, j] > best_scores[active_rows[i]]:
+                best_scores[active_rows[i]] = top_scores[i, j]
+                results[active_rows[i]] = histories[i, top_beams[i, j], :step].tolist()
+
+        # the k best candidates that did not end stay open
+        open_pos = np.argsort(ended, axis=1, kind='stable')[:, :k]
+        beams = np.take_along_axis(top_beams, open_pos, axis=1)
+        token_ids = np.take_along_axis(top_tokens, open_pos, axis=1)
+        scores = np.where(np.take_along_axis(ended, open_pos, axis=1), -np.inf,
+                          np.take_along_axis(top_scores, open_pos, axis=1))
+
+        histories = np.take_along_axis(histories, beams[:, :, np.newaxis], axis=1)
+        histories[:, :, step] = token_ids
+        source_rows = (np.arange(num_active)[:, np.newaxis] * k + beams).ravel()
+        states_value = [state[source_rows] for state in states_value]
+
+        if step == max_target_seq_length - 1:
+            break
+
+        # log-probabilities only lower the score, so an open hypothesis can no longer beat a finished one
+        running = scores.max(axis=1) > best_scores[active_rows]
+        if not running.all():
+            active_rows = active_rows[running]
+            if len(active_rows) == 0:
+                if stats is not None:
+                    stats['steps_saved'] += max_target_seq_length - step - 1
+                break
+            scores = scores[running]
+            histories = histories[running]
+            token_ids = token_ids[running]
+            row_mask = np.repeat(running, k)
+            states_value = [state[row_mask] for state in states_value]
+
+        token_ids = token_ids.ravel()
+
+    # articles still open after max_target_seq_length steps keep their best unterminated hypothesis
+    best_open = scores.argmax(axis=1)
+    for i, row in enumerate(active_rows):
+        if scores[i, best_open[i]] > best_scores[row]:
+            best_scores[row] = scores[i, best_open[i]]
+            results[row] = histories[i, best_open[i], :].tolist()
+
+    return results
+
+
+def trim_at_end_token(token_matrix, end_token_idx):
+    """
+    Converts a (batch_size, num_steps) matrix of generated token ids into one list of token ids per row, cut at the
+    first end token.
+    """
+    results = []
+    for row in token_matrix:
+        end_positions = np.flatnonzero(row == end_token_idx)
+        if len(end_positions) > 0:
+            row = row[:end_positions[0]]
+        results.append(row.tolist())
+    return results
+
+
+def build_greedy_decode_graph(initial_states, decoder_lstm, decoder_dense, embed_inputs, start_token_idx, end_token_idx,
+                              max_target_seq_length):
+    """
+    Builds the whole greedy decode loop into the TensorFlow graph: a tf.while_loop steps the cell of decoder_lstm,
+    feeds the argmax of decoder_dense back through embed_inputs(token_ids) and stops once every row has emitted the
+    end token or max_target_seq_length steps were generated.
+
+    Returns a (batch_size, num_steps) int32 tensor of generated token ids; rows that finished early are filled up with
+    the end token.
+    """
+    cell = decoder_lstm.cell
+    batch_size = tf.shape(initial_states[0])[0]
+
+    def condition(step, token_ids, state_h, state_c, finished, outputs):
+        return tf.logical_and(step < max_target_seq_length, tf.logical_not(tf.reduce_all(finished)))
+
+    def body(step, token_ids, state_h, state_c, finished, outputs):
+        decoder_output, decoder_states = cell.call(embed_inputs(token_ids), [state_h, state_c])
+        decoder_output = decoder_dense.call(decoder_output)
+        token_ids = tf.cast(tf.argmax(decoder_output, axis=-1), tf.int32)
+        token_ids = tf.where(finished, tf.fill([batch_size], end_token_idx), token_ids)
+        outputs = outputs.write(step, token_ids)
+        finished = tf.logical_or(finished, tf.equal(token_ids, end_token_idx))
+        return step + 1, token_ids, decoder_states[0], decoder_states[1], finished, outputs
+
+    loop_vars = [tf.constant(0),
+                 tf.fill([batch_size], start_token_idx),
+                 initial_states[0],
+                 initial_states[1],
+                 tf.zeros([batch_size], dtype=tf.bool),
+                 tf.TensorArray(tf.int32, size=0, dynamic_size=True)]
+    outputs = tf.while_loop(condition, body, loop_vars)[-1]
+    return tf.transpose(outputs.stack())
@@ -1,4 +1,5 @@
 import urllib.request
+from collections.abc import Mapping
 import os
 import sys
 import zipfile
@@ -42,20 +43,116 @@ def download_glove(data_dir_path=None):
         zip_ref.close()
 
 
-def load_glove(data_dir_path=None):
+def get_glove_store_paths(data_dir_path):
+    glove_store_path = data_dir_path + "/glove.6B." + str(GLOVE_EMBEDDING_SIZE) + "d"
+    return glove_store_path + '.npy', glove_store_path + '.vocab.txt'
+
+
+def convert_glove(data_dir_path=None):
+    """
+    One-time conversion of the GloVe text file into a binary store: a contiguous float32 matrix saved as .npy, which
+    load_glove() opens memory-mapped, plus a vocabulary file holding the word of each matrix row, one per line.
+    """
     if data_dir_path is None:
         data_dir_path = 'very_large_data'
     download_glove(data_dir_path)
-    _word2em = {}
+    matrix_path, vocab_path = get_glove_store_paths(data_dir_path)
     glove_model_path = data_dir_path + "/glove.6B." + str(GLOVE_EMBEDDING_SIZE) + "d.txt"
-    file = open(glove_model_path, mode='rt', encoding='utf8')
-    for line in file:
-        words = line.strip().split()
-        word = words[0]
-        embeds = np.array(words[1:], dtype=np.float32)
-        _word2em[word] = embeds
-    file.close()
-    return _word2em
+
+    with open(glove_model_path, mode='rt', encoding='utf8') as file:
+        num_words = sum(1 for _ in file)
+
+    print('converting glove file into', matrix_path)
+    matrix = np.lib.format.open_memmap(matrix_path + '.tmp', mode='w+', dtype=np.float32,
+                                       shape=(num_words, GLOVE_EMBEDDING_SIZE))
+    with open(glove_model_path, mode='rt', encoding='utf8') as file, \
+            open(vocab_path + '.tmp', mode='wt', encoding='utf8') as vocab_file:
+        for idx, line in enumerate(file):
+            words = line.strip().split()
+            vocab_file.write(words[0] + '\n')
+            matrix[idx, :] = np.array(words[1:], dtype=np.float32)
+    matrix.flush()
+    del matrix
+
+    # rename only once both files are complete, so an interrupted conversion is redone on the next call
+    os.replace(vocab_path + '.tmp', vocab_path)
+    os.replace(matrix_path + '.tmp', matrix_path)
+
+
+class GloveEmbeddings(Mapping):
+    """
+    Read-only word -> embedding mapping over a float32 matrix and a word -> row index. The matrix is usually a
+    np.memmap of the binary store written by convert_glove(), so its pages are shared between processes.
+    """
+
+    def __init__(self, matrix, word2idx, stats=None):
+        self.matrix = matrix
+        self.word2idx = word2idx
+        self.stats = stats
+
+    def __getitem__(self, word):
+        return self.matrix[self.word2idx[word]]
+
+    def __contains__(self, word):
+        return word in self.word2idx
+
+    def __iter__(self):
+        return iter(self.word2idx)
+
+    def __len__(self):
+        return len(self.word2idx)
+
+
+def get_vocabulary_words(vocab):
+    """
+    Collects the words of vocab, which is either an iterable of words or a word2idx dict such as the input_word2idx and
+    target_word2idx built by fit_text(), or an iterable of such dicts.
+    """
+    if isinstance(vocab, dict):
+        vocab = [vocab]
+    words = set()
+    for item in vocab:
+        if isinstance(item, dict):
+            words.update(item.keys())
+        else:
+            words.add(item)
+    return words
+
+
+def restrict_glove(word2em, vocab):
+    """
+    Copies the GloVe rows of the words in vocab into a dense matrix, and reports how much of vocab GloVe covers.
+    """
+    words = get_vocabulary_words(vocab)
+    # read the rows in file order, so the memory-mapped matrix is scanned sequentially
+    found = sorted((word2em.word2idx[word], word) for word in words if word in word2em.word2idx)
+    matrix = np.array(word2em.matrix[[row for row, _ in found]], dtype=np.float32)
+    word2idx = dict((word, idx) for idx, (_, word) in enumerate(found))
+
+    stats = dict()
+    stats['vocab_size'] = len(words)
+    stats['num_found'] = len(word2idx)
+    stats['num_oov'] = len(words) - len(word2idx)
+    stats['coverage'] = float(len(word2idx)) / max(len(words), 1)
+    stats['oov_words'] = sorted(word for word in words if word not in word2idx)
+    print('glove coverage: %d of %d words (%.2f%%), %d out of vocabulary' % (
+        stats['num_found'], stats['vocab_size'], stats['coverage'] * 100, stats['num_oov']))
+    return GloveEmbeddings(matrix, word2idx, stats=stats)
+
+
+def load_glove(data_dir_path=None, vocab=None):
+    if data_dir_path is None:
+        data_dir_path = 'very_large_data'
+    matrix_path, vocab_path = get_glove_store_paths(data_dir_path)
+    if not os.path.exists(matrix_path):
+        convert_glove(data_dir_path)
+    matrix = np.load(matrix_path, mmap_mode='r')
+    with open(vocab_path, mode='rt', encoding='utf8') as vocab_file:
+        word2idx = dict((line.rstrip('\n'), idx) for idx, line in enumerate(vocab_file))
+    word2em = GloveEmbeddings(matrix, word2idx)
+    if vocab is not None:
+        word2em = restrict_glove(word2em, vocab)
+    return word2em
 
 
 def glove_zero_emb():
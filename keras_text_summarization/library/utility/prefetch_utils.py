@@ -0,0 +1,176 @@
+from __future__ import print_function
+
+import threading
+import time
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+# how often a blocked producer checks whether the prefetcher was stopped
+PUT_TIMEOUT_SECONDS = 0.1
+
+
+def create_prefetch_stats():
+    """
+    Counters filled by BatchPrefetcher:
+
+    * batches: number of batches handed to the training loop
+    * queue_depth_sum: ready batches in the queue when the training loop asked for the next one, summed over batches
+    * empty_waits: batches the training loop asked for while the queue was empty, i.e. had to wait for
+    * wait_seconds: time the training loop spent waiting for batches
+    * produce_seconds: time the background thread spent building batches
+    """
+    return {'batches': 0, 'queue_depth_sum': 0, 'empty_waits': 0, 'wait_seconds': 0.0, 'produce_seconds': 0.0}
+
+
+def prefetch_report(stats):
+    """
+    Averages of the prefetch stats. Training is input-bound when input_bound_fraction, the fraction of batches the
+    training loop had to wait for, stays well above zero, or mean_queue_depth stays close to zero.
+    """
+    num_batches = max(stats['batches'], 1)
+    report = dict()
+    report['batches'] = stats['batches']
+    report['mean_queue_depth'] = float(stats['queue_depth_sum']) / num_batches
+    report['input_bound_fraction'] = float(stats['empty_waits']) / num_batches
+    report['mean_wait_ms'] = 1000.0 * stats['wait_seconds'] / num_batches
+    report['mean_produce_ms'] = 1000.0 * stats['produce_seconds'] / num_batches
+    return report
+
+
+class BatchPrefetcher(object):
+    """
+    Keeps up to depth batches ready in a bounded queue, built by a background thread while the model trains on the
+    previous ones. batches is either a keras Sequence, which is walked epoch after epoch in index order with
+    on_epoch_end() in between, or an endless generator of batches. The prefetcher itself is an endless generator
+    for fit_generator(..., workers=0), so that the batches reach the training loop straight from the queue.
+
+    Building a batch is mostly numpy work, which releases the GIL, so a thread overlaps well with the train step.
+    """
+
+    def __init__(self, batches, depth, stats=None):
+        self.batches = batches
+        self.queue = Queue(maxsize=depth)
+        self.stats = stats
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.produce)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        # unblock the producer if it is waiting for room in the queue
+        try:
+            while True:
+                self.queue.get_nowait()
+        except Empty:
+            pass
+        self.thread.join()
+
+    def iterate_batches(self):
+        if hasattr(self.batches, '__getitem__') and hasattr(self.batches, '__len__'):
+            while True:
+                for batchIdx in range(0, len(self.batches)):
+                    yield self.batches[batchIdx]
+                self.batches.on_epoch_end()
+        else:
+            for batch in self.batches:
+                yield batch
+
+    def produce(self):
+        try:
+            batch_iterator = self.iterate_batches()
+            while not self.stop_event.is_set():
+                start_time = time.time()
+                batch = next(batch_iterator)
+                if self.stats is not None:
+                    self.stats['produce_seconds'] += time.time() - start_time
+                if not self.put(batch):
+                    return
+        except Exception as error:
+            # handed to the training loop, which raises it
+            self.error = error
+            self.put(None)
+
+    def put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT_SECONDS)
+                return True
+            except Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.stats is None:
+            batch = self.queue.get()
+        else:
+            queue_depth = self.queue.qsize()
+            self.stats['batches'] += 1
+            self.stats['queue_depth_sum'] += queue_depth
+            if queue_depth == 0:
+                self.stats['empty_waits'] += 1
+            start_time = time.time()
+            batch = self.queue.get()
+            self.stats['wait_seconds'] += time.time() - start_time
+        if batch is None:
+            raise self.error
+        return batch
+
+    next = __next__
+
+
+def fit_prefetched(model, train_batches, train_num_batches, test_batches, test_num_batches, prefetch, epochs,
+                   verbose, callbacks, stats=None):
+    """
+    model.fit_generator() with the training and validation batches built by two BatchPrefetchers of depth
+    prefetch. The training batches are counted in stats, which are printed when the training is over.
+    """
+    train_gen = BatchPrefetcher(train_batches, prefetch, stats=stats).start()
+    test_gen = BatchPrefetcher(test_batches, prefetch).start()
+    try:
+        history = model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
+                                      epochs=epochs,
+                                      verbose=verbose, validation_data=test_gen, validation_steps=test_num_batches,
+                                      callbacks=callbacks, workers=0)
+    finally:
+        train_gen.stop()
+        test_gen.stop()
+    if stats is not None:
+        print('prefetch stats: ', prefetch_report(stats))
+    return history
+
+
+def num_prefetch_buffers(prefetch):
+    """
+    Number of reused batch buffers a Sequence needs with fit_sequences(..., prefetch=prefetch): besides the queue,
+    one batch is in training and one waits to be queued while the next is built. None without prefetch.
+    """
+    if prefetch is None:
+        return None
+    return prefetch + 3
+
+
+def fit_sequences(model, train_seq, test_seq, epochs, verbose, callbacks, workers=1, use_multiprocessing=False,
+                  prefetch=None, stats=None):
+    """
+    model.fit_generator() over the batch Sequences train_seq and test_seq. Without prefetch, the batches are built
+    by index, so fit_generator() can build them in several workers at the same time; with prefetch, a background
+    thread keeps that many batches ready while the model trains (see fit_prefetched()).
+    """
+    if prefetch is None:
+        return model.fit_generator(generator=train_seq, steps_per_epoch=len(train_seq), epochs=epochs,
+                                   verbose=verbose, validation_data=test_seq, validation_steps=len(test_seq),
+                                   callbacks=callbacks, workers=workers, use_multiprocessing=use_multiprocessing,
+                                   shuffle=False)
+    return fit_prefetched(model, train_seq, len(train_seq), test_seq, len(test_seq), prefetch, epochs, verbose,
+                          callbacks, stats=stats)
@@ -0,0 +1,325 @@
+import numpy as np
+from keras.utils import Sequence
+
+from keras_text_summarization.library.utility.batch_utils import sequence_lengths, bucket_batches, bucket_order
+from keras_text_summarization.library.utility.corpus_utils import PaddedTexts
+
+
+def take_columns(samples, seq_length, padding):
+    """
+    The seq_length columns of a padded batch that hold the ids (or embeddings) of its rows: the last ones for 'pre'
+    padding, the first ones for 'post' padding.
+    """
+    if padding == 'pre':
+        return samples[:, samples.shape[1] - seq_length:]
+    return samples[:, :seq_length]
+
+
+def take_rows(samples, rows, out=None):
+    """
+    samples[rows] of a padded id matrix, gathered straight into out if given, or of a PaddedTexts, which reads and
+    pads only those rows.
+    """
+    if not isinstance(samples, PaddedTexts):
+        return np.take(samples, rows, axis=0, out=out)
+    if out is None:
+        return samples[rows]
+    out[...] = samples[rows]
+    return out
+
+
+def samples_lengths(samples, padding='pre', value=0):
+    """
+    sequence_lengths() of a padded id matrix, or the length index of a PaddedTexts, which is not padded for it; a
+    row that ends in ids mapped to the padding value then counts them, which only pads its batch a little further.
+    """
+    if isinstance(samples, PaddedTexts):
+        return samples.padded_lengths()
+    return sequence_lengths(samples, padding=padding, value=value)
+
+
+def fill_one_hot(out, wids, filled, hot=None):
+    """
+    Sets out[line, step, wids[line, step]] = 1 for every (line, step) where filled is True, in one fancy-indexed
+    write, and returns those positions. out must be all zeros except at hot, the positions returned by the previous
+    fill of out, which are cleared first; so a reused buffer is cleared in O(words) instead of O(size).
+    """
+    if hot is not None:
+        out[hot] = 0
+    lines, steps = np.nonzero(filled)
+    hot = (lines, steps, wids[lines, steps])
+    out[hot] = 1
+    return hot
+
+
+class Seq2SeqBatchSequence(Sequence):
+    """
+    Batches of the seq2seq summarizers as a keras Sequence: batch batchIdx depends only on batchIdx and on the
+    batch order of the epoch, so fit_generator() can build the batches in any number of worker threads or processes
+    (workers=N, use_multiprocessing=True) and still get the epoch of a single worker.
+
+    The Sequence holds only numpy arrays and plain settings, never the summarizer or its model, so that it can be
+    pickled to the worker processes.
+
+    x_samples are the encoder inputs, padded before ('pre') or after ('post') the words as told by input_padding;
+    y_samples are the target ids, padded after the words with target_padding_value. Both can be PaddedTexts, whose
+    rows are then only read and padded for the batches they are in. The decoder inputs are sparse
+    ids (sparse_targets), rows of target_embeddings (if given), or one-hot vectors. The one-hot vectors are built
+    with fancy indexing in dtype (float32 by default, uint8 takes a quarter of the memory).
+
+    With num_buffers, the batches are built into num_buffers preallocated buffers that are reused in turn, in the
+    order the batches are built (across epochs, not by batchIdx). A batch is then only valid until num_buffers more
+    batches are built, so num_buffers must be larger than the number of batches alive at the same time (e.g. the
+    prefetch queue, the batch in training and the batch being built), and the batches must be built one at a time.
+    """
+
+    def __init__(self, x_samples, y_samples, batch_size, num_target_tokens, bucket_boundaries=None,
+                 input_padding='pre', target_padding_value=0, sparse_targets=False, target_embeddings=None,
+                 dtype=None, num_buffers=None):
+        if dtype is None:
+            dtype = np.float32
+        if not isinstance(y_samples, PaddedTexts):
+            y_samples = np.asarray(y_samples)
+        self.x_samples = x_samples
+        self.y_samples = y_samples
+        self.batch_size = batch_size
+        self.num_target_tokens = num_target_tokens
+        self.bucket_boundaries = bucket_boundaries
+        self.input_padding = input_padding
+        self.sparse_targets = sparse_targets
+        self.target_embeddings = target_embeddings
+        self.dtype = dtype
+        self.buffers = None
+        self.next_slot = 0
+        if num_buffers is not None:
+            self.buffers = [None] * num_buffers
+        self.input_lengths = None
+        self.target_lengths = None
+        self.batches = None
+        if bucket_boundaries is not None or sparse_targets:
+            # sparse targets are weighted by the lengths of the summaries, buckets are cut by them
+            self.target_lengths = samples_lengths(self.y_samples, padding='post', value=target_padding_value)
+        if bucket_boundaries is not None:
+            self.input_lengths = samples_lengths(x_samples, padding=input_padding)
+            self.on_epoch_end()
+
+    def __len__(self):
+        return len(self.x_samples) // self.batch_size
+
+    def on_epoch_end(self):
+        if self.bucket_boundaries is not None:
+            self.batches = bucket_batches(self.input_lengths, self.batch_size, self.bucket_boundaries)
+
+    def next_buffer(self):
+        # the slot comes from a counter of built batches, which unlike batchIdx does not start again every epoch
+        slot = self.next_slot % len(self.buffers)
+        self.next_slot += 1
+        if self.buffers[slot] is None:
+            target_shape = (self.batch_size, self.y_samples.shape[1], self.num_target_tokens)
+            buffer = dict()
+            buffer['encoder_input'] = np.zeros((self.batch_size, ) + self.x_samples.shape[1:],
+                                               dtype=self.x_samples.dtype)
+            if self.sparse_targets:
+                # sparse targets need only the target ids and their weights, never the one-hot vectors
+                buffer['decoder_target'] = np.zeros(target_shape[:2] + (1, ), dtype=np.int32)
+                buffer['decoder_weight'] = np.zeros(target_shape[:2], dtype=np.float32)
+                self.buffers[slot] = buffer
+                return buffer
+            if self.target_embeddings is None:
+                buffer['decoder_input'] = np.zeros(target_shape, dtype=self.dtype)
+            else:
+                buffer['decoder_input'] = np.zeros(target_shape[:2] + self.target_embeddings.shape[1:],
+                                                   dtype=self.target_embeddings.dtype)
+            buffer['decoder_target'] = np.zeros(target_shape, dtype=self.dtype)
+            buffer['decoder_input_hot'] = None
+            buffer['decoder_target_hot'] = None
+            self.buffers[slot] = buffer
+        return self.buffers[slot]
+
+    def __getitem__(self, batchIdx):
+        buffer = None
+        if self.buffers is not None:
+            buffer = self.next_buffer()
+        if self.batches is None:
+            # a slice of the samples needs no copy
+            start = batchIdx * self.batch_size
+            x_batch = self.x_samples[start:start + self.batch_size]
+            target_wids_batch = self.y_samples[start:start + self.batch_size]
+            rows = slice(start, start + self.batch_size)
+        else:
+            # pad the batch only up to its own longest article and summary
+            batch = self.batches[batchIdx]
+            input_seq_length = max(np.max(self.input_lengths[batch]), 1)
+            target_seq_length = max(np.max(self.target_lengths[batch]), 1)
+            if buffer is None:
+                x_batch = take_rows(self.x_samples, batch)
+            else:
+                x_batch = take_rows(self.x_samples, batch, out=buffer['encoder_input'])
+            x_batch = take_columns(x_batch, input_seq_length, self.input_padding)
+            target_wids_batch = self.y_samples[batch, :target_seq_length]
+            rows = batch
+        batch_size, target_seq_length = target_wids_batch.shape
+
+        if self.sparse_targets:
+            if buffer is None:
+                decoder_target_data_batch = np.zeros(shape=(batch_size, target_seq_length, 1), dtype=np.int32)
+            else:
+                decoder_target_data_batch = buffer['decoder_target'][:, :target_seq_length]
+                decoder_target_data_batch[:, -1, 0] = 0
+            decoder_target_data_batch[:, :-1, 0] = target_wids_batch[:, 1:]
+            if buffer is None:
+                decoder_weight_data_batch = np.zeros(shape=(batch_size, target_seq_length), dtype=np.float32)
+            else:
+                decoder_weight_data_batch = buffer['decoder_weight'][:, :target_seq_length]
+            # step idx has a target while idx + 1 is within the summary; [UNK] targets (id 0 as well) keep weight 0,
+            # as the one-hot targets leave them all zeros, so that both train the same words
+            steps = np.arange(target_seq_length)[np.newaxis, :]
+            decoder_weight_data_batch[:] = (steps < self.target_lengths[rows][:, np.newaxis] - 1) & \
+                (decoder_target_data_batch[:, :, 0] != 0)
+            return [x_batch, target_wids_batch], decoder_target_data_batch, decoder_weight_data_batch
+
+        target_shape = (batch_size, target_seq_length, self.num_target_tokens)
+        if buffer is None:
+            buffer = dict()
+            buffer['decoder_target'] = np.zeros(target_shape, dtype=self.dtype)
+            buffer['decoder_target_hot'] = None
+            if self.target_embeddings is None:
+                buffer['decoder_input'] = np.zeros(target_shape, dtype=self.dtype)
+                buffer['decoder_input_hot'] = None
+
+        if self.target_embeddings is not None:
+            if self.buffers is None:
+                decoder_input_data_batch = self.target_embeddings[target_wids_batch]
+            else:
+                decoder_input_data_batch = buffer['decoder_input'][:, :target_seq_length]
+                np.take(self.target_embeddings, target_wids_batch, axis=0, out=decoder_input_data_batch, mode='clip')
+        else:
+            decoder_input_data_batch = buffer['decoder_input'][:, :target_seq_length]
+            # skip [UNK] and padding
+            buffer['decoder_input_hot'] = fill_one_hot(buffer['decoder_input'], target_wids_batch,
+                                                       target_wids_batch != 0, buffer['decoder_input_hot'])
+
+        # the target at step idx is the decoder input at step idx + 1; [UNK], 'start' and padding are skipped
+        next_wids_batch = target_wids_batch[:, 1:]
+        decoder_target_data_batch = buffer['decoder_target'][:, :target_seq_length]
+        buffer['decoder_target_hot'] = fill_one_hot(buffer['decoder_target'], next_wids_batch,
+                                                    (next_wids_batch > 0) & (next_wids_batch < self.num_target_tokens),
+                                                    buffer['decoder_target_hot'])
+        return [x_batch, decoder_input_data_batch], decoder_target_data_batch
+
+
+class OneShotBatchSequence(Sequence):
+    """
+    Batches of OneShotRNN as a keras Sequence: the encoder inputs and the one-hot vectors of the whole summary. The
+    samples can be PaddedTexts, whose rows are then only read and padded for the batches they are in.
+    """
+
+    def __init__(self, x_samples, y_samples, batch_size, num_target_tokens):
+        self.x_samples = x_samples
+        self.y_samples = y_samples
+        self.batch_size = batch_size
+        self.num_target_tokens = num_target_tokens
+
+    def __len__(self):
+        return len(self.x_samples) // self.batch_size
+
+    def __getitem__(self, batchIdx):
+        start = batchIdx * self.batch_size
+        end = (batchIdx + 1) * self.batch_size
+        target_wids_batch = np.asarray(self.y_samples[start:end])
+        decoder_target_data_batch = np.zeros(shape=target_wids_batch.shape + (self.num_target_tokens,))
+        lines, steps = np.nonzero(target_wids_batch != 0)  # skip [UNK] and padding
+        decoder_target_data_batch[lines, steps, target_wids_batch[lines, steps]] = 1
+        return self.x_samples[start:end], decoder_target_data_batch
+
+
+class RecursiveBatchSequence(Sequence):
+    """
+    Batches of the recursive rnn models as a keras Sequence. Every summary of n words gives n - 1 samples, one per
+    summary prefix: (article, prefix of prefix_length words) -> the next word. The samples are expanded once into a
+    flat index of (article, prefix_length, next word id) arrays, over which the batches are plain slices (or
+    gathers, when bucketing reorders the articles every epoch); the prefixes themselves are gathered from the flat
+    target ids of all the summaries. The last samples of an epoch that do not fill a batch are left out.
+
+    y_samples are the word lists of split_target_text(). The prefixes are padded before the words up to
+    decoder_seq_length, keeping their last decoder_seq_length words, or with bucket_boundaries up to the longest
+    prefix of the batch, the articles then also only up to the longest article of the batch.
+
+    The labels are one-hot vectors, or with sparse_targets the next word ids together with sample weights that
+    leave out the [UNK] labels, which are all-zero vectors in the one-hot case. x_samples can be a PaddedTexts,
+    whose rows are then only read and padded for the batches they are in.
+    """
+
+    def __init__(self, x_samples, y_samples, batch_size, target_word2idx, num_target_tokens, decoder_seq_length,
+                 bucket_boundaries=None, sparse_targets=False):
+        self.x_samples = x_samples
+        self.batch_size = batch_size
+        self.num_target_tokens = num_target_tokens
+        self.decoder_seq_length = decoder_seq_length
+        self.bucket_boundaries = bucket_boundaries
+        self.sparse_targets = sparse_targets
+
+        summary_lengths = np.array([len(target_words) for target_words in y_samples], dtype=np.int64)
+        # target ids of all the summaries one after the other, summary recordIdx starts at offsets[recordIdx]
+        self.target_wids = np.array([target_word2idx.get(w, 0) for target_words in y_samples for w in target_words],
+                                    dtype=np.int32)  # default [UNK] is 0
+        offsets = np.cumsum(summary_lengths) - summary_lengths
+        self.num_record_samples = np.maximum(summary_lengths - 1, 0)
+        self.record_sample_starts = np.cumsum(self.num_record_samples) - self.num_record_samples
+        num_samples = int(np.sum(self.num_record_samples))
+
+        # sample k: the first sample_prefix_lengths[k] words of summary sample_records[k] -> sample_next_wids[k]
+        self.sample_records = np.repeat(np.arange(len(y_samples)), self.num_record_samples)
+        self.sample_prefix_lengths = np.arange(num_samples) - self.record_sample_starts[self.sample_records] + 1
+        self.sample_prefix_ends = offsets[self.sample_records] + self.sample_prefix_lengths
+        self.sample_next_wids = self.target_wids[self.sample_prefix_ends]
+
+        self.input_lengths = None
+        self.sample_order = None
+        if bucket_boundaries is not None:
+            self.input_lengths = samples_lengths(x_samples, padding='pre')
+            self.on_epoch_end()
+
+    def __len__(self):
+        return len(self.sample_records) // self.batch_size
+
+    def on_epoch_end(self):
+        if self.bucket_boundaries is not None:
+            # the samples of the articles in bucket order, each article keeping the order of its prefixes
+            record_order = bucket_order(self.input_lengths, self.bucket_boundaries)
+            counts = self.num_record_samples[record_order]
+            shifts = self.record_sample_starts[record_order] - (np.cumsum(counts) - counts)
+            self.sample_order = np.repeat(shifts, counts) + np.arange(len(self.sample_records))
+
+    def __getitem__(self, batchIdx):
+        start = batchIdx * self.batch_size
+        samples = slice(start, start + self.batch_size)
+        if self.sample_order is not None:
+            samples = self.sample_order[samples]
+        records = self.sample_records[samples]
+        prefix_lengths = self.sample_prefix_lengths[samples]
+        prefix_ends = self.sample_prefix_ends[samples]
+        next_wids = self.sample_next_wids[samples]
+
+        decoder_seq_length = self.decoder_seq_length
+        x_batch = take_rows(self.x_samples, records)
+        if self.bucket_boundaries is not None:
+            # pad the batch only up to its own longest article and summary prefix
+            decoder_seq_length = np.max(prefix_lengths)
+            x_batch = take_columns(x_batch, max(np.max(self.input_lengths[records]), 1), 'pre')
+
+        columns = np.arange(decoder_seq_length)[np.newaxis, :] - decoder_seq_length
+        filled = columns >= -prefix_lengths[:, np.newaxis]
+        decoder_input_data_batch = np.where(filled, self.target_wids[np.where(filled, prefix_ends[:, np.newaxis] +
+                                                                               columns, 0)], 0).astype(np.int32)
+
+        if self.sparse_targets:
+            # every sample is a word within its summary, so only the [UNK] targets (id 0) keep weight 0, as in the
+            # one-hot targets
+            decoder_weight_data_batch = (next_wids != 0).astype(np.float32)
+            return [x_batch, decoder_input_data_batch], next_wids[:, np.newaxis], decoder_weight_data_batch
+
+        decoder_target_data_batch = np.zeros(shape=(self.batch_size, self.num_target_tokens))
+        lines = np.flatnonzero(next_wids != 0)
+        decoder_target_data_batch[lines, next_wids[lines]] = 1
+        return [x_batch, decoder_input_data_batch], decoder_target_data_batch
@@ -0,0 +1,162 @@
+from __future__ import print_function
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+from keras.callbacks import ModelCheckpoint
+from keras_text_summarization.library.utility.prefetch_utils import fit_prefetched
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_EPOCHS = 10
+VERBOSE = 1
+
+
+def is_test_key(key, test_size):
+    """
+    Deterministic train/test split: the row with this key is a test row when the first 32 bits of the md5 of the
+    key fall into the first test_size fraction. Unlike hash(), md5 gives the same split on every run and machine.
+    """
+    digest = hashlib.md5(str(key).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) < test_size * 2 ** 32
+
+
+class CsvTextStream(object):
+    """
+    Reads the (article, summary) pairs of a csv file chunk by chunk with pd.read_csv(chunksize=...), so that the
+    file never needs to fit in memory. With split='train' or split='test' only the rows of that side of the hash
+    split are read; the rows are keyed by key_column, or by their row number in the file.
+
+    Every iteration reads the file again from the start.
+    """
+
+    def __init__(self, csv_file_path, text_column='text', summary_column='title', key_column=None, split=None,
+                 test_size=0.2, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        self.csv_file_path = csv_file_path
+        self.text_column = text_column
+        self.summary_column = summary_column
+        self.key_column = key_column
+        self.split = split
+        self.test_size = test_size
+        self.chunk_size = chunk_size
+
+    def iterate_chunks(self):
+        columns = [self.text_column, self.summary_column]
+        if self.key_column is not None:
+            columns.append(self.key_column)
+        for chunk in pd.read_csv(self.csv_file_path, usecols=columns, chunksize=self.chunk_size):
+            if self.split is not None:
+                # the index of the chunks continues over the whole file
+                keys = chunk.index if self.key_column is None else chunk[self.key_column]
+                is_test = np.array([is_test_key(key, self.test_size) for key in keys], dtype=bool)
+                chunk = chunk[is_test] if self.split == 'test' else chunk[~is_test]
+            yield list(chunk[self.text_column]), list(chunk[self.summary_column])
+
+    def texts(self):
+        for texts, _ in self.iterate_chunks():
+            for text in texts:
+                yield text
+
+    def summaries(self):
+        for _, summaries in self.iterate_chunks():
+            for summary in summaries:
+                yield summary
+
+    def count_rows(self):
+        return sum([len(texts) for texts, _ in self.iterate_chunks()])
+
+
+def transform_chunk(summarizer, texts, summaries):
+    x_samples = summarizer.transform_input_text(texts)
+    if hasattr(summarizer, 'split_target_text'):
+        # recursive rnn: one training sample per summary word after START
+        y_samples = summarizer.split_target_text(summaries)
+        num_samples = sum([len(target_words) - 1 for target_words in y_samples])
+    else:
+        y_samples = summarizer.transform_target_encoding(summaries)
+        num_samples = len(x_samples)
+    return x_samples, y_samples, num_samples
+
+
+def generate_stream_batch(summarizer, stream, batch_size):
+    """
+    Endless generator of the training batches of summarizer for fit_generator(): every chunk of the stream is
+    transformed and run through the summarizer's own generate_batch(). Rows left over after the last full batch of
+    a chunk are carried into the next chunk; the recursive rnn models, whose batches are cut from the words of the
+    summaries, drop their last partial batch of every chunk instead.
+    """
+    recursive = hasattr(summarizer, 'split_target_text')
+    while True:
+        texts_left = []
+        summaries_left = []
+        for texts, summaries in stream.iterate_chunks():
+            texts = texts_left + texts
+            summaries = summaries_left + summaries
+            num_rows = len(texts)
+            if not recursive:
+                num_rows = len(texts) // batch_size * batch_size
+                texts_left = texts[num_rows:]
+                summaries_left = summaries[num_rows:]
+            if num_rows == 0:
+                continue
+            x_samples, y_samples, num_samples = transform_chunk(summarizer, texts[:num_rows], summaries[:num_rows])
+            chunk_gen = summarizer.generate_batch(x_samples, y_samples, batch_size)
+            for batchIdx in range(0, num_samples // batch_size):
+                yield next(chunk_gen)
+
+
+def count_stream_batches(summarizer, stream, batch_size):
+    """
+    Number of batches generate_stream_batch() yields per pass over the stream.
+    """
+    if not hasattr(summarizer, 'split_target_text'):
+        return stream.count_rows() // batch_size
+    num_batches = 0
+    for _, summaries in stream.iterate_chunks():
+        y_samples = summarizer.split_target_text(summaries)
+        num_batches += sum([len(target_words) - 1 for target_words in y_samples]) // batch_size
+    return num_batches
+
+
+def fit_stream(summarizer, train_stream, test_stream, epochs=None, batch_size=None, model_dir_path=None,
+               prefetch=None):
+    """
+    Same as summarizer.fit(), but the training and validation batches are read lazily from two CsvTextStreams. With
+    prefetch, a background thread keeps that many batches ready, reading and transforming the next chunks of the
+    csv file while the model trains.
+    """
+    if epochs is None:
+        epochs = DEFAULT_EPOCHS
+    if model_dir_path is None:
+        model_dir_path = './models'
+    if batch_size is None:
+        batch_size = DEFAULT_BATCH_SIZE
+
+    summarizer.version += 1
+    summarizer.config['version'] = summarizer.version
+    config_file_path = summarizer.get_config_file_path(model_dir_path)
+    weight_file_path = summarizer.get_weight_file_path(model_dir_path)
+    checkpoint = ModelCheckpoint(weight_file_path)
+    np.save(config_file_path, summarizer.config)
+    architecture_file_path = summarizer.get_architecture_file_path(model_dir_path)
+    open(architecture_file_path, 'w').write(summarizer.model.to_json())
+
+    train_gen = generate_stream_batch(summarizer, train_stream, batch_size)
+    test_gen = generate_stream_batch(summarizer, test_stream, batch_size)
+
+    train_num_batches = count_stream_batches(summarizer, train_stream, batch_size)
+    test_num_batches = count_stream_batches(summarizer, test_stream, batch_size)
+
+    if prefetch is None:
+        history = summarizer.model.fit_generator(generator=train_gen, steps_per_epoch=train_num_batches,
+                                                 epochs=epochs,
+                                                 verbose=VERBOSE, validation_data=test_gen,
+                                                 validation_steps=test_num_batches, callbacks=[checkpoint])
+    else:
+        history = fit_prefetched(summarizer.model, train_gen, train_num_batches, test_gen, test_num_batches, prefetch,
+                                 epochs, VERBOSE, [checkpoint], stats=summarizer.prefetch_stats)
+    summarizer.model.save_weights(weight_file_path)
+    return history
@@ -0,0 +1,174 @@
+import json
+import os
+
+import numpy as np
+from keras_text_summarization.library.utility.corpus_utils import EncodedTexts
+
+TOKEN_DATASET_FORMAT_VERSION = 1
+DEFAULT_SHARD_SIZE = 100000
+
+
+def index_rows(num_rows, index):
+    """
+    The row numbers selected by a slice, index array or boolean mask over num_rows rows.
+    """
+    if isinstance(index, slice):
+        return np.arange(*index.indices(num_rows))
+    rows = np.asarray(index)
+    if rows.dtype == bool:
+        rows = np.flatnonzero(rows)
+    return rows
+
+
+class ShardedArray(object):
+    """
+    The rows of several arrays of the same width (the memory-mapped shards of a token dataset) read as one array,
+    or only the selected rows of them, in the order of rows. Indexing with a row index, slice or index array,
+    optionally followed by a column index, only reads the selected rows from their shards and returns them as a numpy
+    array; select_rows() selects rows without reading them.
+    """
+
+    def __init__(self, shards, width, dtype=np.int32, rows=None):
+        self.shards = shards
+        self.width = width
+        self.dtype = dtype
+        self.rows = rows
+        self.offsets = np.cumsum([0] + [len(shard) for shard in shards])
+        num_rows = int(self.offsets[-1])
+        if rows is not None:
+            num_rows = len(rows)
+        self.shape = (num_rows, width)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def select_rows(self, index):
+        if isinstance(index, tuple):
+            index = index[0]
+        rows = index_rows(len(self), index)
+        if self.rows is not None:
+            rows = self.rows[rows]
+        return ShardedArray(self.shards, self.width, dtype=self.dtype, rows=rows)
+
+    def __getitem__(self, index):
+        columns = slice(None)
+        if isinstance(index, tuple):
+            index, columns = index
+        if isinstance(index, (int, np.integer)):
+            if self.rows is not None:
+                index = self.rows[index]
+            shard_idx = np.searchsorted(self.offsets, index, side='right') - 1
+            return np.asarray(self.shards[shard_idx][index - self.offsets[shard_idx]])[columns]
+        rows = index_rows(len(self), index)
+        if self.rows is not None:
+            rows = self.rows[rows]
+        result = np.empty(shape=(len(rows), self.shape[1]), dtype=self.dtype)
+        shard_ids = np.searchsorted(self.offsets, rows, side='right') - 1
+        for shard_idx in np.unique(shard_ids):
+            selected = shard_ids == shard_idx
+            result[selected] = self.shards[shard_idx][rows[selected] - self.offsets[shard_idx]]
+        return result[:, columns]
+
+
+class TokenDatasetWriter(object):
+    """
+    Writes a token dataset: a directory of fixed-width int32 shards of encoder (input-*.npy) and decoder
+    (target-*.npy) token ids, shard_size rows each, next to the length index of all rows (input-lengths.npy,
+    target-lengths.npy), the word lists of the ids and a dataset.json manifest. The ids are those of EncodedTexts,
+    left-aligned and filled up with zeros; longer rows are cut at input_width / target_width.
+
+    Rows are added with write(), in chunks of any size, and close() writes the index and manifest.
+    """
+
+    def __init__(self, dir_path, input_width, target_width, shard_size=None):
+        if shard_size is None:
+            shard_size = DEFAULT_SHARD_SIZE
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.dir_path = dir_path
+        self.input_width = input_width
+        self.target_width = target_width
+        self.shard_size = shard_size
+        self.input_words = None
+        self.target_words = None
+        self.shard_rows = []
+        self.input_lengths = []
+        self.target_lengths = []
+        self.pending_inputs = []
+        self.pending_targets = []
+        self.num_pending = 0
+
+    def write(self, X_encoded, Y_encoded):
+        if self.input_words is None:
+            self.input_words = X_encoded.words
+            self.target_words = Y_encoded.words
+        elif X_encoded.words != self.input_words or Y_encoded.words != self.target_words:
+            raise ValueError('all the chunks of a token dataset must be encoded with the same words')
+        self.pending_inputs.append(X_encoded.to_padded(self.input_width, padding='post'))
+        self.pending_targets.append(Y_encoded.to_padded(self.target_width, padding='post'))
+        self.input_lengths.append(np.minimum(X_encoded.lengths, self.input_width).astype(np.int32))
+        self.target_lengths.append(np.minimum(Y_encoded.lengths, self.target_width).astype(np.int32))
+        self.num_pending += len(X_encoded)
+        while self.num_pending >= self.shard_size:
+            self.write_shard(self.shard_size)
+
+    def write_shard(self, num_rows):
+        inputs = np.concatenate(self.pending_inputs)
+        targets = np.concatenate(self.pending_targets)
+        shard_idx = len(self.shard_rows)
+        np.save(os.path.join(self.dir_path, 'input-%05d.npy' % shard_idx), inputs[:num_rows])
+        np.save(os.path.join(self.dir_path, 'target-%05d.npy' % shard_idx), targets[:num_rows])
+        self.shard_rows.append(num_rows)
+        self.pending_inputs = [inputs[num_rows:]]
+        self.pending_targets = [targets[num_rows:]]
+        self.num_pending -= num_rows
+
+    def close(self):
+        if self.num_pending > 0:
+            self.write_shard(self.num_pending)
+        np.save(os.path.join(self.dir_path, 'input-lengths.npy'),
+                np.concatenate(self.input_lengths + [np.zeros(0, dtype=np.int32)]))
+        np.save(os.path.join(self.dir_path, 'target-lengths.npy'),
+                np.concatenate(self.target_lengths + [np.zeros(0, dtype=np.int32)]))
+        with open(os.path.join(self.dir_path, 'input-words.json'), 'w') as file:
+            json.dump(self.input_words, file)
+        with open(os.path.join(self.dir_path, 'target-words.json'), 'w') as file:
+            json.dump(self.target_words, file)
+        manifest = dict()
+        manifest['format_version'] = TOKEN_DATASET_FORMAT_VERSION
+        manifest['num_rows'] = int(sum(self.shard_rows))
+        manifest['shard_rows'] = self.shard_rows
+        manifest['input_width'] = self.input_width
+        manifest['target_width'] = self.target_width
+        # written last: a directory without dataset.json is an unfinished dataset
+        with open(os.path.join(self.dir_path, 'dataset.json'), 'w') as file:
+            json.dump(manifest, file)
+
+
+def write_token_dataset(dir_path, X_encoded, Y_encoded, shard_size=None):
+    writer = TokenDatasetWriter(dir_path, X_encoded.shape[1], Y_encoded.shape[1], shard_size=shard_size)
+    writer.write(X_encoded, Y_encoded)
+    writer.close()
+
+
+def open_token_dataset(dir_path):
+    """
+    Opens the shards and length index of a token dataset with np.memmap (read-only, so several training processes
+    share the same pages) and returns them as the EncodedTexts X, Y, which the fit() of every summarizer accepts.
+    Split them by index arrays (X[rows]), which reads nothing; fit() then reads the rows of every batch only when
+    the batch is built.
+    """
+    with open(os.path.join(dir_path, 'dataset.json')) as file:
+        manifest = json.load(file)
+    if manifest['format_version'] != TOKEN_DATASET_FORMAT_VERSION:
+        raise ValueError('unsupported token dataset format version: ' + str(manifest['format_version']))
+
+    encoded_texts = []
+    for name, width in [('input', manifest['input_width']), ('target', manifest['target_width'])]:
+        shards = [np.load(os.path.join(dir_path, '%s-%05d.npy' % (name, shard_idx)), mmap_mode='r')
+                  for shard_idx in range(len(manifest['shard_rows']))]
+        lengths = np.load(os.path.join(dir_path, name + '-lengths.npy'), mmap_mode='r')
+        with open(os.path.join(dir_path, name + '-words.json')) as file:
+            words = json.load(file)
+        encoded_texts.append(EncodedTexts(ShardedArray(shards, width), lengths, words))
+    return encoded_texts[0], encoded_texts[1]